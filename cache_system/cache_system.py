@@ -20,9 +20,68 @@ Solution:
     - Eviction Algo. (LRU)
     - Data structure: DLL + Hashmap
 
+Other eviction policies (all O(1) per operation, created by CacheFactory):
+    - LFU: evict the least frequently used key, ties broken by recency.
+           {freq: keys in recency order} + minimum frequency.
+    - ARC: adapts between recency (T1) and frequency (T2) using ghost
+           lists (B1, B2) of recently evicted keys.
+    - 2Q: new keys enter a FIFO (A1in); only keys requested again after
+          leaving it (remembered in A1out) reach the main LRU (Am).
+    - W-TinyLFU: small LRU window in front of a segmented LRU; a count-min
+                 sketch of recent frequencies decides whether a key leaving
+                 the window may replace the main cache's victim.
+    Scans of one-off keys flush plain LRU but not ARC, 2Q or W-TinyLFU.
+    Every policy has an O(1) delete(key), returning whether it was cached.
+    simulate() replays key traces against each policy and reports hit
+    ratio and throughput.
+
+Shared-memory LRU (SharedMemoryLRUCache, "SharedLRU"):
+    - Worker processes that each build their own LRUCache hold N copies
+      of the data and take N misses per key. This cache keeps its whole
+      state in one multiprocessing.shared_memory block: a hash table of
+      bucket heads, per-slot arrays of hash, prev/next (the DLL, as slot
+      indices) and chain links, and fixed-size slots holding the pickled
+      key and value. A multiprocessing.Lock guards it.
+    - Keys are found by a blake2b hash of their pickle, which is the same
+      in every process (unlike hash()), and compared by pickled bytes, so
+      keys must pickle deterministically (str, bytes, int, tuples...).
+    - Processes started with fork share the creator's cache; others get
+      it pickled (name and lock) through multiprocessing.Process args.
+      Entries too big for a slot are not cached.
+
+Server (python cache_system.py serve):
+    - asyncio TCP server speaking the commands above, one per line:
+      SET key value -> OK, GET key -> value or NULL, DELETE key -> OK or
+      NULL, BEGIN / COMMIT / ROLLBACK -> OK, anything wrong -> ERR ...
+    - One coroutine per connection. A connection's transaction buffers its
+      writes (its own GETs see them) until COMMIT applies them in order.
+    - Pipelined commands are read in chunks and every complete line of a
+      chunk is run against the cache in one go, answered with one write.
+    - python cache_system.py bench runs a load generator against it and
+      reports p50/p99 latency and ops/s.
+
 """
+import argparse
+import asyncio
+import hashlib
+import multiprocessing
+import pickle
+import random
+import socket
+import subprocess
+import sys
+import time
+import tracemalloc
+import weakref
+from collections import OrderedDict
+from multiprocessing import shared_memory
+
 
 class Node:
+    # No per-node __dict__: about 40 bytes less per entry, roughly a quarter
+    # of a small entry once the map slot and key are counted.
+    __slots__ = ("key", "val", "prev", "next")
+
     def __init__(self, key=0, val=0, prev=None, next=None):
         self.key = key
         self.val = val
@@ -38,16 +97,15 @@ class DLL:
         self.tail.prev = self.head
 
 class LRUCache:
-    def __init__(self, capacity):
+    def __init__(self, capacity, node_class=Node):
+        # node_class builds the entries, benchmarkNodeLayout passes the old layout.
         self.key_to_cache_node_map = {}
         self.dll = DLL()
         self.capacity = capacity
         self.size = 0
+        self.node_class = node_class
 
     def _move_node_to_front(self, node):
-        # Store head next in temp variable.
-        temp = self.dll.head.next
-
         # Remove node from current position
         if node.prev: 
             node.prev.next = node.next
@@ -55,6 +113,10 @@ class LRUCache:
         if node.next:
             node.next.prev = node.prev
 
+        # Store head next in temp variable. Read it after unlinking, the node
+        # may have been the head next itself.
+        temp = self.dll.head.next
+
         # Connect node with head.
         node.prev = self.dll.head
         self.dll.head.next = node
@@ -67,7 +129,6 @@ class LRUCache:
         node = self.key_to_cache_node_map.get(key, None)
 
         if not node:
-            print(f"Key {key} doesn't exist in cache.")
             return 
     
         val = node.val
@@ -105,7 +166,7 @@ class LRUCache:
 
             self.size -= 1
 
-        node = Node(key, value)
+        node = self.node_class(key, value)
 
         # Insert the node at the start of DLL.
         self._move_node_to_front(node)
@@ -115,28 +176,920 @@ class LRUCache:
 
         self.size += 1
 
+    def delete(self, key):
+        node = self.key_to_cache_node_map.pop(key, None)
+        if not node:
+            return False
+
+        node.prev.next = node.next
+        node.next.prev = node.prev
+        node.prev = node.next = None
+        self.size -= 1
+        return True
+
+class LFUCache:
+    def __init__(self, capacity):
+        self.key_to_value_map = {}
+        self.key_to_freq_map = {}
+        # Dicts with None values keep the keys of one frequency in recency
+        # order, oldest first.
+        self.freq_to_keys_map = {}
+        self.min_freq = 0
+        self.capacity = capacity
+
+    def _touch(self, key):
+        freq = self.key_to_freq_map[key]
+        keys = self.freq_to_keys_map[freq]
+        del keys[key]
+        if not keys:
+            del self.freq_to_keys_map[freq]
+            if self.min_freq == freq:
+                self.min_freq = freq + 1
+
+        self.key_to_freq_map[key] = freq + 1
+        self.freq_to_keys_map.setdefault(freq + 1, {})[key] = None
+
+    def get(self, key):
+        if key not in self.key_to_value_map:
+            return None
+
+        self._touch(key)
+        return self.key_to_value_map[key]
+
+    def put(self, key, value):
+        if self.capacity <= 0:
+            return
+
+        if key in self.key_to_value_map:
+            self.key_to_value_map[key] = value
+            self._touch(key)
+            return
+
+        if len(self.key_to_value_map) == self.capacity:
+            # Least frequently used, and least recently used among those.
+            keys = self.freq_to_keys_map[self.min_freq]
+            key_to_remove = next(iter(keys))
+            del keys[key_to_remove]
+            if not keys:
+                del self.freq_to_keys_map[self.min_freq]
+            del self.key_to_value_map[key_to_remove]
+            del self.key_to_freq_map[key_to_remove]
+
+        self.key_to_value_map[key] = value
+        self.key_to_freq_map[key] = 1
+        self.freq_to_keys_map.setdefault(1, {})[key] = None
+        self.min_freq = 1
+
+    def delete(self, key):
+        if key not in self.key_to_value_map:
+            return False
+
+        freq = self.key_to_freq_map.pop(key)
+        keys = self.freq_to_keys_map[freq]
+        del keys[key]
+        if not keys:
+            del self.freq_to_keys_map[freq]
+        del self.key_to_value_map[key]
+        # min_freq may now name an empty frequency. That is fine: the cache
+        # is no longer full, and the put that fills it again sets min_freq.
+        return True
+
+
+class ARCCache:
+    """
+    Adaptive Replacement Cache (Megiddo & Modha). T1 holds keys seen once
+    recently, T2 keys seen at least twice. B1 and B2 remember the keys
+    recently evicted from them, without values. A miss that hits B1 means
+    T1 was too small, one that hits B2 means T2 was; target_t1 (p in the
+    paper) moves accordingly.
+    """
+    def __init__(self, capacity):
+        self.t1 = OrderedDict()
+        self.t2 = OrderedDict()
+        self.b1 = OrderedDict()
+        self.b2 = OrderedDict()
+        self.target_t1 = 0
+        self.capacity = capacity
+
+    def get(self, key):
+        if key in self.t1:
+            value = self.t1.pop(key)
+            self.t2[key] = value
+            return value
+        if key in self.t2:
+            self.t2.move_to_end(key)
+            return self.t2[key]
+        return None
+
+    def put(self, key, value):
+        if self.capacity <= 0:
+            return
+
+        if key in self.t1:
+            del self.t1[key]
+            self.t2[key] = value
+            return
+        if key in self.t2:
+            self.t2[key] = value
+            self.t2.move_to_end(key)
+            return
+
+        if key in self.b1:
+            self.target_t1 = min(self.capacity, self.target_t1 + max(len(self.b2) // len(self.b1), 1))
+            self._replace(in_b2=False)
+            del self.b1[key]
+            self.t2[key] = value
+            return
+        if key in self.b2:
+            self.target_t1 = max(0, self.target_t1 - max(len(self.b1) // len(self.b2), 1))
+            self._replace(in_b2=True)
+            del self.b2[key]
+            self.t2[key] = value
+            return
+
+        if len(self.t1) + len(self.b1) == self.capacity:
+            if len(self.t1) < self.capacity:
+                self.b1.popitem(last=False)
+                self._replace(in_b2=False)
+            else:
+                self.t1.popitem(last=False)
+        else:
+            total = len(self.t1) + len(self.t2) + len(self.b1) + len(self.b2)
+            if total >= self.capacity:
+                if total == 2 * self.capacity:
+                    self.b2.popitem(last=False)
+                self._replace(in_b2=False)
+        self.t1[key] = value
+
+    def delete(self, key):
+        # Ghost entries hold no value, so they are left alone.
+        for resident in (self.t1, self.t2):
+            if key in resident:
+                del resident[key]
+                return True
+        return False
+
+    def _replace(self, in_b2):
+        # Evict from T1 or T2, whichever is over its target, into its ghost list.
+        if self.t1 and (len(self.t1) > self.target_t1 or (in_b2 and len(self.t1) == self.target_t1)):
+            key, _ = self.t1.popitem(last=False)
+            self.b1[key] = None
+        elif self.t2:
+            key, _ = self.t2.popitem(last=False)
+            self.b2[key] = None
+
+
+class TwoQCache:
+    """
+    Full 2Q (Johnson & Shasha). New keys go to the A1in FIFO. Keys pushed
+    out of A1in are remembered in A1out; requesting one of those again
+    admits it to Am, the main LRU. A burst of one-off keys only churns A1in.
+    """
+    def __init__(self, capacity, in_ratio=0.25, out_ratio=0.5):
+        self.a1in = OrderedDict()
+        self.a1out = OrderedDict()
+        self.am = OrderedDict()
+        self.capacity = capacity
+        self.max_a1in = max(1, int(capacity * in_ratio))
+        self.max_a1out = max(1, int(capacity * out_ratio))
+
+    def get(self, key):
+        if key in self.am:
+            self.am.move_to_end(key)
+            return self.am[key]
+        # A hit in A1in does not move the key, it stays in FIFO order.
+        return self.a1in.get(key, None)
+
+    def put(self, key, value):
+        if self.capacity <= 0:
+            return
+
+        if key in self.am:
+            self.am[key] = value
+            self.am.move_to_end(key)
+            return
+        if key in self.a1in:
+            self.a1in[key] = value
+            return
+
+        self._reclaim()
+        if key in self.a1out:
+            del self.a1out[key]
+            self.am[key] = value
+        else:
+            self.a1in[key] = value
+
+    def delete(self, key):
+        for queue in (self.a1in, self.am):
+            if key in queue:
+                del queue[key]
+                return True
+        return False
+
+    def _reclaim(self):
+        if len(self.a1in) + len(self.am) < self.capacity:
+            return
+        if len(self.a1in) > self.max_a1in or not self.am:
+            key, _ = self.a1in.popitem(last=False)
+            self.a1out[key] = None
+            if len(self.a1out) > self.max_a1out:
+                self.a1out.popitem(last=False)
+        else:
+            self.am.popitem(last=False)
+
+
+class CountMinSketch:
+    """
+    Approximate access counts for W-TinyLFU: depth rows of counters capped
+    at 15, a key's estimate is its smallest counter. After sample_size
+    increments all counters are halved, so old popularity fades.
+    """
+    SEEDS = (0x9E3779B1, 0x85EBCA77, 0xC2B2AE3D, 0x27D4EB2F)
+
+    def __init__(self, width, sample_size):
+        self.width = max(16, width)
+        self.rows = [[0] * self.width for _ in self.SEEDS]
+        self.sample_size = sample_size
+        self.additions = 0
+
+    def _indexes(self, key):
+        key_hash = hash(key)
+        width = self.width
+        return [((key_hash ^ seed) * 0x5BD1E995 >> 7) % width for seed in self.SEEDS]
+
+    def increment(self, key):
+        for row, index in zip(self.rows, self._indexes(key)):
+            if row[index] < 15:
+                row[index] += 1
+        self.additions += 1
+        if self.additions >= self.sample_size:
+            # Amortized O(1): one O(width) pass every sample_size increments.
+            for row in self.rows:
+                for index in range(self.width):
+                    row[index] >>= 1
+            self.additions //= 2
+
+    def estimate(self, key):
+        return min([row[index] for row, index in zip(self.rows, self._indexes(key))])
+
+
+class WTinyLFUCache:
+    """
+    W-TinyLFU (Einziger, Friedman & Manes). A 1% LRU window absorbs new
+    keys. The rest is a segmented LRU: probation (20%) and protected (80%).
+    A key leaving the window only enters the main cache if the sketch says
+    it is used more often than the probation victim it would replace.
+    """
+    def __init__(self, capacity, window_ratio=0.01, protected_ratio=0.8):
+        self.window = OrderedDict()
+        self.probation = OrderedDict()
+        self.protected = OrderedDict()
+        self.capacity = capacity
+        self.max_window = max(1, int(capacity * window_ratio)) if capacity > 0 else 0
+        self.max_main = capacity - self.max_window
+        self.max_protected = int(self.max_main * protected_ratio)
+        self.sketch = CountMinSketch(width=4 * capacity, sample_size=10 * max(capacity, 1))
+        # A read-through miss is a get followed by a put of the same key;
+        # count that as one access, not two.
+        self.last_missed_key = None
+
+    def get(self, key):
+        self.sketch.increment(key)
+        value = self._hit(key)
+        self.last_missed_key = key if value is None else None
+        return value
+
+    def _hit(self, key):
+        if key in self.window:
+            self.window.move_to_end(key)
+            return self.window[key]
+        if key in self.protected:
+            self.protected.move_to_end(key)
+            return self.protected[key]
+        if key in self.probation:
+            # Second hit in the main cache, promote to protected.
+            value = self.probation.pop(key)
+            self.protected[key] = value
+            if len(self.protected) > self.max_protected:
+                demoted_key, demoted_value = self.protected.popitem(last=False)
+                self.probation[demoted_key] = demoted_value
+            return value
+        return None
+
+    def put(self, key, value):
+        if self.capacity <= 0:
+            return
+
+        if key != self.last_missed_key:
+            self.sketch.increment(key)
+        self.last_missed_key = None
+        for segment in (self.window, self.probation, self.protected):
+            if key in segment:
+                segment[key] = value
+                self._hit(key)
+                return
+
+        self.window[key] = value
+        if len(self.window) <= self.max_window:
+            return
+
+        candidate_key, candidate_value = self.window.popitem(last=False)
+        if len(self.probation) + len(self.protected) < self.max_main:
+            self.probation[candidate_key] = candidate_value
+            return
+        if self.max_main <= 0:
+            return
+
+        victims = self.probation if self.probation else self.protected
+        victim_key = next(iter(victims))
+        if self.sketch.estimate(candidate_key) > self.sketch.estimate(victim_key):
+            del victims[victim_key]
+            self.probation[candidate_key] = candidate_value
+
+    def delete(self, key):
+        # The sketch keeps the key's count, it is frequency history.
+        for segment in (self.window, self.probation, self.protected):
+            if key in segment:
+                del segment[key]
+                return True
+        return False
+
+
+class SharedMemoryLRUCache:
+    # Header fields, one int64 each.
+    CAPACITY, SLOT_SIZE, BUCKETS, HEAD, TAIL, SIZE, USED, FREE, HITS, MISSES, REJECTIONS = range(11)
+    HEADER_FIELDS = 16
+    NONE = -1
+
+    def __init__(self, capacity, slot_size=256, name=None, lock=None):
+        """
+        Create a new shared cache of capacity slots of slot_size bytes
+        (pickled key + value), or attach to the existing one called name,
+        which needs the creator's lock. For workers started with a non
+        default multiprocessing context, pass a lock from that context.
+        """
+        if name is None:
+            buckets = 1 << max(1, (2 * capacity - 1).bit_length())
+            self.shm = shared_memory.SharedMemory(create=True, size=self._layout_size(capacity, slot_size, buckets))
+            self.lock = lock or multiprocessing.Lock()
+            header = self.shm.buf[:8 * self.HEADER_FIELDS].cast("q")
+            header[self.CAPACITY] = capacity
+            header[self.SLOT_SIZE] = slot_size
+            header[self.BUCKETS] = buckets
+            header.release()
+            self._map()
+            self.header[self.HEAD] = self.header[self.TAIL] = self.header[self.FREE] = self.NONE
+            for index in range(buckets):
+                self.buckets[index] = self.NONE
+            # The creator owns the block: free it when this object goes away.
+            self.finalizer = weakref.finalize(self, SharedMemoryLRUCache._destroy, self.shm, self._views())
+        else:
+            # Processes started by multiprocessing share the creator's
+            # resource tracker, so attaching here does not change who unlinks.
+            self.shm = shared_memory.SharedMemory(name=name)
+            self.lock = lock
+            self._map()
+            self.finalizer = weakref.finalize(self, SharedMemoryLRUCache._destroy, None, self._views())
+        self.capacity = self.header[self.CAPACITY]
+
+    @classmethod
+    def _layout_size(cls, capacity, slot_size, buckets):
+        return 8 * (cls.HEADER_FIELDS + buckets + 6 * capacity) + capacity * slot_size
+
+    def _map(self):
+        # Cast the regions of the block into int64 arrays and a byte area.
+        buffer = self.shm.buf
+        header = buffer[:8 * self.HEADER_FIELDS].cast("q")
+        capacity, slot_size, buckets = header[self.CAPACITY], header[self.SLOT_SIZE], header[self.BUCKETS]
+        offset = 8 * self.HEADER_FIELDS
+        arrays = []
+        for length in (buckets, capacity, capacity, capacity, capacity, capacity, capacity):
+            arrays.append(buffer[offset:offset + 8 * length].cast("q"))
+            offset += 8 * length
+        self.header = header
+        self.buckets, self.hashes, self.prev, self.next, self.chain, self.key_lengths, self.value_lengths = arrays
+        self.data = buffer[offset:offset + capacity * slot_size]
+        self.slot_size = slot_size
+
+    def _views(self):
+        return [self.header, self.buckets, self.hashes, self.prev, self.next, self.chain,
+                self.key_lengths, self.value_lengths, self.data]
+
+    @staticmethod
+    def _destroy(shm, views):
+        # Views must be released before the block can be closed.
+        for view in views:
+            view.release()
+        if shm is not None:
+            shm.close()
+            shm.unlink()
+
+    def close(self):
+        self.finalizer()
+
+    def __getstate__(self):
+        # Only works while starting a process, like any multiprocessing.Lock.
+        return {"name": self.shm.name, "lock": self.lock}
+
+    def __setstate__(self, state):
+        self.__init__(None, name=state["name"], lock=state["lock"])
+
+    @staticmethod
+    def _hash(key_bytes):
+        return int.from_bytes(hashlib.blake2b(key_bytes, digest_size=8).digest(), "little", signed=True)
+
+    def _find(self, key_hash, key_bytes):
+        # (slot, previous slot in the bucket chain), slot is NONE if missing.
+        before = self.NONE
+        slot = self.buckets[key_hash % self.header[self.BUCKETS]]
+        while slot != self.NONE:
+            if self.hashes[slot] == key_hash and self._key(slot) == key_bytes:
+                return slot, before
+            before, slot = slot, self.chain[slot]
+        return slot, before
+
+    def _key(self, slot):
+        start = slot * self.slot_size
+        return bytes(self.data[start:start + self.key_lengths[slot]])
+
+    def _value(self, slot):
+        start = slot * self.slot_size + self.key_lengths[slot]
+        return bytes(self.data[start:start + self.value_lengths[slot]])
+
+    def _write(self, slot, key_bytes, value_bytes):
+        start = slot * self.slot_size
+        self.data[start:start + len(key_bytes)] = key_bytes
+        self.data[start + len(key_bytes):start + len(key_bytes) + len(value_bytes)] = value_bytes
+        self.key_lengths[slot] = len(key_bytes)
+        self.value_lengths[slot] = len(value_bytes)
+
+    def _unlink(self, slot):
+        prev, next = self.prev[slot], self.next[slot]
+        if prev == self.NONE:
+            self.header[self.HEAD] = next
+        else:
+            self.next[prev] = next
+        if next == self.NONE:
+            self.header[self.TAIL] = prev
+        else:
+            self.prev[next] = prev
+
+    def _link_front(self, slot):
+        head = self.header[self.HEAD]
+        self.prev[slot] = self.NONE
+        self.next[slot] = head
+        if head == self.NONE:
+            self.header[self.TAIL] = slot
+        else:
+            self.prev[head] = slot
+        self.header[self.HEAD] = slot
+
+    def _move_to_front(self, slot):
+        if self.header[self.HEAD] != slot:
+            self._unlink(slot)
+            self._link_front(slot)
+
+    def _remove(self, slot, before):
+        # Drop slot from its bucket chain and the DLL, and free it.
+        if before == self.NONE:
+            self.buckets[self.hashes[slot] % self.header[self.BUCKETS]] = self.chain[slot]
+        else:
+            self.chain[before] = self.chain[slot]
+        self._unlink(slot)
+        self.next[slot] = self.header[self.FREE]
+        self.header[self.FREE] = slot
+        self.header[self.SIZE] -= 1
+
+    def _remove_slot(self, slot):
+        # Same as _remove, for a slot whose chain predecessor is unknown.
+        _, before = self._find(self.hashes[slot], self._key(slot))
+        self._remove(slot, before)
+
+    def get(self, key):
+        key_bytes = pickle.dumps(key, pickle.HIGHEST_PROTOCOL)
+        key_hash = self._hash(key_bytes)
+        with self.lock:
+            slot, _ = self._find(key_hash, key_bytes)
+            if slot == self.NONE:
+                self.header[self.MISSES] += 1
+                return None
+            self._move_to_front(slot)
+            self.header[self.HITS] += 1
+            value_bytes = self._value(slot)
+        return pickle.loads(value_bytes)
+
+    def put(self, key, value):
+        key_bytes = pickle.dumps(key, pickle.HIGHEST_PROTOCOL)
+        value_bytes = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        key_hash = self._hash(key_bytes)
+        with self.lock:
+            slot, before = self._find(key_hash, key_bytes)
+            if len(key_bytes) + len(value_bytes) > self.slot_size:
+                # Too big to cache, and the old value must not be served.
+                if slot != self.NONE:
+                    self._remove(slot, before)
+                self.header[self.REJECTIONS] += 1
+                return
+
+            if slot != self.NONE:
+                self._write(slot, key_bytes, value_bytes)
+                self._move_to_front(slot)
+                return
+
+            if self.header[self.SIZE] == self.capacity:
+                # Evict the least recently used slot (the DLL tail).
+                self._remove_slot(self.header[self.TAIL])
+            if self.header[self.FREE] != self.NONE:
+                slot = self.header[self.FREE]
+                self.header[self.FREE] = self.next[slot]
+            else:
+                slot = self.header[self.USED]
+                self.header[self.USED] += 1
+
+            self._write(slot, key_bytes, value_bytes)
+            self.hashes[slot] = key_hash
+            bucket = key_hash % self.header[self.BUCKETS]
+            self.chain[slot] = self.buckets[bucket]
+            self.buckets[bucket] = slot
+            self._link_front(slot)
+            self.header[self.SIZE] += 1
+
+    def delete(self, key):
+        key_bytes = pickle.dumps(key, pickle.HIGHEST_PROTOCOL)
+        with self.lock:
+            slot, before = self._find(self._hash(key_bytes), key_bytes)
+            if slot == self.NONE:
+                return False
+            self._remove(slot, before)
+            return True
+
+    def stats(self):
+        with self.lock:
+            return {
+                "size": self.header[self.SIZE],
+                "capacity": self.capacity,
+                "hits": self.header[self.HITS],
+                "misses": self.header[self.MISSES],
+                "rejections": self.header[self.REJECTIONS],
+                "bytes": self.shm.size,
+            }
+
+
 class CacheFactory:
+    cache_types = {
+        "LRU": LRUCache,
+        "LFU": LFUCache,
+        "ARC": ARCCache,
+        "2Q": TwoQCache,
+        "W-TinyLFU": WTinyLFUCache,
+        "SharedLRU": SharedMemoryLRUCache,
+    }
+
     @staticmethod
     def create_cache(cache_type, capacity=5):
-        if cache_type == "LRU":
-            return LRUCache(capacity)
-        
+        if cache_type not in CacheFactory.cache_types:
+            raise Exception(f"Unknown cache type {cache_type}, expected one of {list(CacheFactory.cache_types)}.")
+
+        return CacheFactory.cache_types[cache_type](capacity)
 
-cache = CacheFactory.create_cache("LRU")
+    @staticmethod
+    def register(cache_type, cache_class):
+        # cache_class(capacity) must provide get(key) and put(key, value).
+        CacheFactory.cache_types[cache_type] = cache_class
 
-# Create interactive mode for testing (You can improve interactive 
-# test based on how you want to test.)
-exit = 0
-while(~exit):
-    qtype = int(input())
 
-    if qtype == 1:
-        key = input()
-        print(cache.get(key))
-    elif qtype == 2:
-        key, value = input().split(" ")
-        print(cache.put(key, value))
-    else:
-        continue
+def loadTrace(path):
+    # One key per line, e.g. exported from access logs.
+    with open(path) as trace_file:
+        return [line.strip() for line in trace_file if line.strip()]
+
+
+def generateTraces(length=200_000, keys=50_000, seed=0):
+    """Traces for simulate(): where scan resistance and frequency matter."""
+    rng = random.Random(seed)
+    # Log-uniform ranks, close to a Zipf(1) popularity curve.
+    zipf = [int(keys ** rng.random()) - 1 for _ in range(length)]
+    # Zipf traffic interrupted by scans over keys that are never seen again.
+    scans = []
+    while len(scans) < length:
+        scans += [int(keys ** rng.random()) - 1 for _ in range(5000)]
+        scans += list(range(keys + len(scans), keys + len(scans) + 3000))
+    # Loop over a range slightly larger than the cache, LRU's worst case.
+    loop = [index % 2500 for index in range(length)]
+    return {"zipf": zipf, "zipf + scans": scans[:length], "loop": loop}
+
 
-    print(cache.cache.key_to_cache_node_map, "\n")
+def simulate(traces, capacity=2000, cache_types=None):
+    """
+    Replay each trace against each cache type as a read-through cache
+    (a miss puts the key) and report hit ratio and operations per second.
+    traces is {name: [key, ...]}, e.g. {"prod": loadTrace("keys.txt")}.
+    """
+    results = {}
+    for trace_name, trace in traces.items():
+        for cache_type in cache_types or CacheFactory.cache_types:
+            cache = CacheFactory.create_cache(cache_type, capacity)
+            hits = 0
+            start = time.perf_counter()
+            for key in trace:
+                if cache.get(key) is None:
+                    cache.put(key, key)
+                else:
+                    hits += 1
+            elapsed = time.perf_counter() - start
+            results[(trace_name, cache_type)] = (hits / len(trace), len(trace) / elapsed)
+            print(f"{trace_name:>14} {cache_type:>10}: hit ratio {hits / len(trace):.3f}, "
+                  f"{len(trace) / elapsed / 1000:.0f}k ops/s")
+    return results
+
+
+def _sharedCacheWorker(cache, capacity, results, seed, requests, keys, value_size):
+    # Replay a Zipf trace read-through. Without a shared cache, build and
+    # measure a private one of capacity entries.
+    rng = random.Random(seed)
+    private = cache is None
+    if private:
+        tracemalloc.start()
+        cache = LRUCache(capacity)
+    hits = 0
+    for _ in range(requests):
+        key = int(keys ** rng.random()) - 1
+        if cache.get(key) is None:
+            cache.put(key, f"{key:0{value_size}d}")
+        else:
+            hits += 1
+    memory = tracemalloc.get_traced_memory()[0] if private else 0
+    results.put((hits, memory))
+
+
+def benchmarkSharedCache(workers=4, capacity=5_000, requests=100_000, keys=50_000, value_size=100):
+    """
+    workers processes replay Zipf traces read-through: each with its own
+    LRUCache of capacity entries, or all with one SharedMemoryLRUCache of
+    capacity entries, or of workers * capacity, the same number of entries
+    as all the private caches together. Reports the combined hit rate and
+    the memory the caches take in total.
+    """
+    context = multiprocessing.get_context("fork")
+    results = {}
+    for name, shared_capacity in (("per-process", None), ("shared", capacity), ("shared, N x", workers * capacity)):
+        shared = None
+        if shared_capacity:
+            shared = SharedMemoryLRUCache(shared_capacity, slot_size=value_size + 64, lock=context.Lock())
+        queue = context.Queue()
+        processes = [
+            context.Process(target=_sharedCacheWorker, args=(shared, capacity, queue, seed, requests, keys, value_size))
+            for seed in range(workers)
+        ]
+        for process in processes:
+            process.start()
+        outcomes = [queue.get() for _ in processes]
+        for process in processes:
+            process.join()
+
+        hit_rate = sum(hits for hits, _ in outcomes) / (workers * requests)
+        memory = shared.stats()["bytes"] if shared else sum(memory for _, memory in outcomes)
+        if shared:
+            shared.close()
+        results[name] = (hit_rate, memory)
+        print(f"{name:>12}: hit rate {hit_rate:.3f}, {memory / 2 ** 20:.1f} MiB across {workers} workers")
+    return results
+
+
+class _DictNode:
+    # The node layout before __slots__, kept as the baseline for benchmarkNodeLayout.
+    def __init__(self, key=0, val=0, prev=None, next=None):
+        self.key = key
+        self.val = val
+        self.prev = prev
+        self.next = next
+
+
+def benchmarkNodeLayout(entries=10_000_000, operations=1_000_000):
+    """
+    Fill an LRUCache to entries keys with the old dict-backed nodes and with
+    the slotted Node, then report bytes per entry (tracemalloc, int keys
+    included, values are None) and get/put ops/s on the full cache.
+    """
+    results = {}
+    for name, node_class in (("__dict__", _DictNode), ("__slots__", Node)):
+        tracemalloc.start()
+        cache = LRUCache(entries, node_class)
+        for key in range(entries):
+            cache.put(key, None)
+        per_entry = tracemalloc.get_traced_memory()[0] / entries
+        tracemalloc.stop()
+
+        rng = random.Random(0)
+        keys = [rng.randrange(entries * 2) for _ in range(operations)]
+        start = time.perf_counter()
+        for key in keys:
+            if cache.get(key) is None:
+                cache.put(key, None)
+        throughput = operations / (time.perf_counter() - start)
+        results[name] = (per_entry, throughput)
+        print(f"{name:>10}: {per_entry:.0f} bytes/entry, {throughput / 1000:.0f}k ops/s at {entries} entries")
+        del cache
+    return results
+
+
+_DELETED = object()  # Marks a key deleted inside a transaction.
+
+
+class Session:
+    """
+    Command state of one client: runs protocol lines against the shared
+    cache and holds the client's open transaction, if any.
+    """
+    def __init__(self, cache):
+        self.cache = cache
+        self.transaction = None  # Ordered list of (key, value or _DELETED).
+        self.pending = None  # Latest transaction write per key, for reads.
+
+    def execute(self, line):
+        parts = line.split(" ", 2)
+        command = parts[0].upper()
+        arguments = parts[1:]
+
+        if command == "SET" and len(arguments) == 2:
+            return self._write(arguments[0], arguments[1])
+        if command == "GET" and len(arguments) == 1:
+            value = self.pending.get(arguments[0]) if self.pending else None
+            if value is None:
+                value = self.cache.get(arguments[0])
+            return "NULL" if value is None or value is _DELETED else value
+        if command == "DELETE" and len(arguments) == 1:
+            if not hasattr(self.cache, "delete"):
+                return f"ERR DELETE not supported by {type(self.cache).__name__}"
+            return self._write(arguments[0], _DELETED)
+        if command == "BEGIN" and not arguments:
+            if self.transaction is not None:
+                return "ERR transaction already open"
+            self.transaction, self.pending = [], {}
+            return "OK"
+        if command in ("COMMIT", "ROLLBACK") and not arguments:
+            if self.transaction is None:
+                return "ERR no open transaction"
+            transaction, self.transaction, self.pending = self.transaction, None, None
+            if command == "COMMIT":
+                # Nothing awaits in here, so no other client sees it half applied.
+                for key, value in transaction:
+                    self._apply(key, value)
+            return "OK"
+        return f"ERR bad command {line!r}"
+
+    def _write(self, key, value):
+        if self.transaction is not None:
+            self.transaction.append((key, value))
+            self.pending[key] = value
+            return "OK"
+        return self._apply(key, value)
+
+    def _apply(self, key, value):
+        if value is _DELETED:
+            return "OK" if self.cache.delete(key) else "NULL"
+        self.cache.put(key, value)
+        return "OK"
+
+
+class CacheServer:
+    def __init__(self, cache, max_line=1 << 20):
+        self.cache = cache
+        self.max_line = max_line
+
+    async def handle(self, reader, writer):
+        session = Session(self.cache)
+        buffer = b""
+        try:
+            while True:
+                data = await reader.read(1 << 16)
+                if not data:
+                    break
+                # Run every complete line of the chunk, answer them together.
+                *lines, buffer = (buffer + data).split(b"\n")
+                responses = [session.execute(line.decode(errors="replace").strip()) for line in lines if line.strip()]
+                if len(buffer) > self.max_line:
+                    responses.append("ERR line too long")
+                if responses:
+                    writer.write(("\n".join(responses) + "\n").encode())
+                    await writer.drain()
+                if len(buffer) > self.max_line:
+                    break
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self, host="127.0.0.1", port=7379):
+        server = await asyncio.start_server(self.handle, host, port, backlog=4096)
+        async with server:
+            await server.serve_forever()
+
+
+async def loadGenerator(host, port, connections=1000, requests=200_000, pipeline=1, keys=10_000, set_ratio=0.1, seed=0):
+    """
+    Open connections clients, each sending its share of requests in
+    pipelined batches of pipeline commands. A request's latency is the
+    round trip of its batch.
+    """
+    per_connection = max(requests // connections, 1)
+    streams = await asyncio.gather(*(asyncio.open_connection(host, port) for _ in range(connections)))
+    latencies = []
+
+    async def client(index, reader, writer):
+        rng = random.Random(seed + index)
+        sent = 0
+        while sent < per_connection:
+            count = min(pipeline, per_connection - sent)
+            batch = []
+            for _ in range(count):
+                key = rng.randrange(keys)
+                batch.append(f"SET k{key} v{key}\n" if rng.random() < set_ratio else f"GET k{key}\n")
+            start = time.perf_counter()
+            writer.write("".join(batch).encode())
+            for _ in range(count):
+                await reader.readline()
+            latencies.extend([time.perf_counter() - start] * count)
+            sent += count
+
+    start = time.perf_counter()
+    await asyncio.gather(*(client(index, reader, writer) for index, (reader, writer) in enumerate(streams)))
+    elapsed = time.perf_counter() - start
+    for _, writer in streams:
+        writer.close()
+
+    latencies.sort()
+    return {
+        "ops/s": len(latencies) / elapsed,
+        "p50": latencies[len(latencies) // 2],
+        "p99": latencies[int(len(latencies) * 0.99)],
+    }
+
+
+def benchmarkServer(connection_counts=(10, 1000, 5000), pipelines=(1, 16), requests=200_000):
+    """
+    Start a server in a subprocess and run the load generator against it
+    with different numbers of connections and pipeline depths.
+    """
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        port = probe.getsockname()[1]
+    server = subprocess.Popen([sys.executable, __file__, "serve", "--port", str(port), "--capacity", "100000"])
+    try:
+        for _ in range(100):
+            try:
+                socket.create_connection(("127.0.0.1", port)).close()
+                break
+            except OSError:
+                time.sleep(0.05)
+
+        results = {}
+        for connections in connection_counts:
+            for pipeline in pipelines:
+                result = asyncio.run(loadGenerator("127.0.0.1", port, connections, requests, pipeline))
+                results[(connections, pipeline)] = result
+                print(
+                    f"{connections:>5} connections, pipeline {pipeline:>2}: {result['ops/s']:.0f} ops/s, "
+                    f"p50 {result['p50'] * 1000:.2f} ms, p99 {result['p99'] * 1000:.2f} ms"
+                )
+        return results
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def interactive(cache):
+    # Type protocol lines (SET/GET/DELETE/BEGIN/COMMIT/ROLLBACK), EXIT to stop.
+    session = Session(cache)
+    while True:
+        try:
+            line = input().strip()
+        except EOFError:
+            break
+        if line.upper() == "EXIT":
+            break
+        if line:
+            print(session.execute(line))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Cache system with a line protocol front end.")
+    parser.add_argument("mode", nargs="?", default="interactive", choices=("interactive", "serve", "bench"))
+    parser.add_argument("--cache", default="LRU", choices=sorted(CacheFactory.cache_types))
+    parser.add_argument("--capacity", type=int, default=5)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=7379)
+    parser.add_argument("--connections", type=int, default=1000)
+    parser.add_argument("--requests", type=int, default=200_000)
+    parser.add_argument("--pipeline", type=int, default=1)
+    args = parser.parse_args()
+
+    if args.mode == "bench":
+        result = asyncio.run(loadGenerator(args.host, args.port, args.connections, args.requests, args.pipeline))
+        print(f"{result['ops/s']:.0f} ops/s, p50 {result['p50'] * 1000:.2f} ms, p99 {result['p99'] * 1000:.2f} ms")
+    else:
+        cache = CacheFactory.create_cache(args.cache, args.capacity)
+        if args.mode == "serve":
+            asyncio.run(CacheServer(cache).serve(args.host, args.port))
+        else:
+            interactive(cache)
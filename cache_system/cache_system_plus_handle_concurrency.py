@@ -4,15 +4,252 @@ Create a custom ReaderWriter lock to handle concurrency.
       (cache in this case).
     - Write should be performed exclusively as it can generate 
       wrong results for other threads.
+    - Writers are preferred: once one waits, new readers queue behind it,
+      otherwise a steady stream of readers starves writers.
+    - get looks keys up under the read lock, so misses run in parallel.
+      A hit moves the node to the front, which needs the write lock: it
+      takes the upgradeable lock, which still lets readers in until the
+      moment it upgrades.
+    - LRUCache.stats()["lock"] has the lock's per-mode acquisitions, wait
+      and hold times and queue depth.
 
 Below code is improvement of v1 which contains implementation of cache
 without handling concurrency.
 
+Sharding (ShardedLRUCache):
+    - One lock serializes every thread, so hash keys to N independent
+      LRUCache segments, each with its own lock and DLL.
+    - The capacity budget is split across the segments, so the total
+      number of entries never exceeds it.
+    - Stats (hits, misses, evictions) are kept per segment and summed.
+
+CLOCK (ClockCache):
+    - Every LRU hit moves a node, so every hit needs the write lock.
+    - CLOCK keeps entries in a ring of slots with a referenced bit. A hit
+      only sets the bit, which needs no lock. On eviction the hand sweeps
+      the ring, clearing set bits and evicting the first entry whose bit
+      was already clear, which approximates LRU.
+
+Expiry (TTL):
+    - put takes a per-key ttl, LRUCache a default_ttl. get checks the
+      expiry lazily and treats an expired key as a miss.
+    - A hierarchical timing wheel (TimingWheel) finds expired keys without
+      scanning the DLL: O(1) to schedule or cancel a key, O(1) amortized
+      per tick to find what is due. reap_expired removes due keys in
+      bounded batches, each under one short write lock, so many keys
+      expiring together never block readers for long.
+
+Byte budget (max_weight):
+    - capacity counts entries, which says nothing about memory when values
+      range from bytes to megabytes. With max_weight set, every entry is
+      weighed by weigher(key, value) (default_weigher by default) and put
+      evicts from the tail until the new entry fits.
+    - An entry heavier than the whole budget is rejected (and any old
+      value under its key dropped) instead of flushing the cache.
+    - ShardedLRUCache keeps one budget over all segments: a put that takes
+      the total over max_weight evicts segment tails round-robin.
+
+Read-through (LoadingCache, AsyncLoadingCache):
+    - get(key) loads a missing key with a user loader and caches it.
+      Concurrent misses on one key share a single in-flight load
+      (single-flight), so a hot key expiring costs the backend one call,
+      not one per waiting thread.
+    - With negative_ttl set, a loader returning None is cached for that
+      long, so lookups of missing rows don't all reach the backend.
+      Without it None is not cached and the next get loads again.
+    - With refresh_ahead, a hit in the last part of the entry's ttl
+      reloads it in the background while callers keep getting the cached
+      value, so hot keys never expire under load.
+
 """
 
+import asyncio
+import contextlib
+import random
+import sys
 import threading
+import time
+import tracemalloc
+from concurrent.futures import Future, ThreadPoolExecutor
+
+# Rough per-entry cost of the Node, its attributes and the map slot,
+# measured with tracemalloc.
+ENTRY_OVERHEAD = 150
+
+
+def default_weigher(key, value):
+    # Shallow sizes: pass a custom weigher for containers of large objects.
+    return sys.getsizeof(key) + sys.getsizeof(value) + ENTRY_OVERHEAD
+
 
 class ReaderWriterLock:
+    """
+    Writer-preferring reader-writer lock with an upgradeable read mode.
+    - read: shared. New readers wait while a writer holds or waits for the
+      lock, so a steady stream of readers cannot starve writers.
+    - upgradeable: shared with readers but held by one thread at a time
+      and excluded by writers, so upgrade() to write is atomic: nothing
+      can change between the read and the write.
+    - write: exclusive.
+    Every acquisition records its wait and hold time and the queue depth
+    it saw, see stats().
+    """
+    def __init__(self):
+        self.readers = 0
+        self.writer = False
+        self.upgradeable_held = False
+        self.upgraded = False
+        self.waiting_readers = 0
+        self.waiting_writers = 0
+        self.condition = threading.Condition()
+        self.local = threading.local()  # Per-thread acquire times for hold stats.
+        self.counters = {
+            mode: {"acquisitions": 0, "wait_total": 0.0, "wait_max": 0.0, "hold_total": 0.0, "hold_max": 0.0, "queue_max": 0}
+            for mode in ("read", "upgradeable", "write")
+        }
+
+    def _acquired(self, mode, started, queue):
+        # Called with the condition held.
+        now = time.perf_counter()
+        counters = self.counters[mode]
+        counters["acquisitions"] += 1
+        counters["wait_total"] += now - started
+        counters["wait_max"] = max(counters["wait_max"], now - started)
+        counters["queue_max"] = max(counters["queue_max"], queue)
+        setattr(self.local, mode, now)
+
+    def _released(self, mode):
+        held = time.perf_counter() - getattr(self.local, mode)
+        counters = self.counters[mode]
+        counters["hold_total"] += held
+        counters["hold_max"] = max(counters["hold_max"], held)
+
+    def acquire_read(self):
+        started = time.perf_counter()
+        with self.condition:
+            self.waiting_readers += 1
+            queue = self.waiting_readers + self.waiting_writers
+            while self.writer or self.waiting_writers:
+                self.condition.wait()
+            self.waiting_readers -= 1
+            self.readers += 1
+            self._acquired("read", started, queue)
+
+    def release_read(self):
+        with self.condition:
+            self._released("read")
+            self.readers -= 1
+            if self.readers == 0:
+                self.condition.notify_all()
+
+    def acquire_upgradeable(self):
+        started = time.perf_counter()
+        with self.condition:
+            self.waiting_readers += 1
+            queue = self.waiting_readers + self.waiting_writers
+            while self.writer or self.upgradeable_held or self.waiting_writers:
+                self.condition.wait()
+            self.waiting_readers -= 1
+            self.upgradeable_held = True
+            self._acquired("upgradeable", started, queue)
+
+    def upgrade(self):
+        # Holder of the upgradeable lock only. Waits for the plain readers
+        # to leave; new ones queue behind it like behind any writer.
+        started = time.perf_counter()
+        with self.condition:
+            self.waiting_writers += 1
+            queue = self.waiting_readers + self.waiting_writers
+            while self.readers:
+                self.condition.wait()
+            self.waiting_writers -= 1
+            self.writer = self.upgraded = True
+            self._acquired("write", started, queue)
+
+    def downgrade(self):
+        with self.condition:
+            self._released("write")
+            self.writer = self.upgraded = False
+            self.condition.notify_all()
+
+    def release_upgradeable(self):
+        with self.condition:
+            if self.upgraded:
+                self._released("write")
+                self.writer = self.upgraded = False
+            self._released("upgradeable")
+            self.upgradeable_held = False
+            self.condition.notify_all()
+
+    def acquire_write(self):
+        started = time.perf_counter()
+        with self.condition:
+            self.waiting_writers += 1
+            queue = self.waiting_readers + self.waiting_writers
+            while self.writer or self.readers or self.upgradeable_held:
+                self.condition.wait()
+            self.waiting_writers -= 1
+            self.writer = True
+            self._acquired("write", started, queue)
+
+    def release_write(self):
+        with self.condition:
+            self._released("write")
+            self.writer = False
+            self.condition.notify_all()
+
+    @contextlib.contextmanager
+    def read(self):
+        self.acquire_read()
+        try:
+            yield self
+        finally:
+            self.release_read()
+
+    @contextlib.contextmanager
+    def upgradeable(self):
+        # Call upgrade() inside to write; released correctly either way.
+        self.acquire_upgradeable()
+        try:
+            yield self
+        finally:
+            self.release_upgradeable()
+
+    @contextlib.contextmanager
+    def write(self):
+        self.acquire_write()
+        try:
+            yield self
+        finally:
+            self.release_write()
+
+    def stats(self):
+        with self.condition:
+            stats = {mode: dict(counters) for mode, counters in self.counters.items()}
+            stats["waiting_readers"] = self.waiting_readers
+            stats["waiting_writers"] = self.waiting_writers
+            return stats
+
+    @staticmethod
+    def merge_stats(all_stats):
+        # Combine stats() of several locks, e.g. the segments of a sharded cache.
+        merged = {}
+        for stats in all_stats:
+            for name, value in stats.items():
+                if isinstance(value, dict):
+                    counters = merged.setdefault(name, dict.fromkeys(value, 0))
+                    for counter, amount in value.items():
+                        if counter.endswith("_max"):
+                            counters[counter] = max(counters[counter], amount)
+                        else:
+                            counters[counter] += amount
+                else:
+                    merged[name] = merged.get(name, 0) + value
+        return merged
+
+
+class _ReaderPreferringLock:
+    # The lock before writer preference, kept as the baseline for benchmarkWriterLatency.
     def __init__(self):
         self.readers = 0
         self.writer = False
@@ -42,11 +279,16 @@ class ReaderWriterLock:
             self.condition.notify_all()
 
 class Node:
+    __slots__ = ("key", "val", "prev", "next", "expires_at", "timer_bucket", "weight")
+
     def __init__(self, key=0, val=0, prev=None, next=None):
         self.key = key
         self.val = val
         self.prev = prev
         self.next = next
+        self.expires_at = None
+        self.timer_bucket = None  # TimingWheel bucket holding this node, if scheduled.
+        self.weight = 0
 
 class DLL:
     def __init__(self):
@@ -57,21 +299,176 @@ class DLL:
         self.tail.prev = self.head
 
 
+class TimingWheel:
+    """
+    Hierarchical timing wheel. Level 0 has one bucket per tick, every level
+    above it has buckets spanning a whole turn of the level below. A node
+    lands in the lowest level whose range covers its expiry; when a lower
+    level wraps around, the next bucket of the level above is cascaded down.
+    Buckets are dicts, so a node is cancelled in O(1) through its
+    timer_bucket.
+
+    Expired buckets are handed over whole (no copying), cascades are spread
+    over calls and empty buckets are jumped over rather than walked tick by
+    tick, so one advance does O(limit) work however many nodes expire on the
+    same tick and however far the clock has moved.
+    """
+    def __init__(self, tick=0.1, bits=6, levels=4, now=0.0):
+        self.tick = tick
+        self.bits = bits
+        self.mask = (1 << bits) - 1
+        self.wheels = [[{} for _ in range(1 << bits)] for _ in range(levels)]
+        self.current_tick = int(now / tick)
+        self.due = []  # Buckets of expired nodes not handed out by advance yet.
+        self.cascading = []  # Buckets still to be spread over the lower levels.
+        self.scheduled = 0
+
+    def schedule(self, node, expires_at):
+        self.cancel(node)
+        # Round up so a node is never reported before it expires.
+        expiry_tick = -int(-expires_at // self.tick)
+        if expiry_tick <= self.current_tick:
+            if not self.due:
+                self.due.append({})
+            bucket = self.due[-1]
+        else:
+            # Lowest level above which expiry and current tick agree, so the
+            # bucket is reached (and cascaded) before the node is due.
+            level = 0
+            top = len(self.wheels) - 1
+            while level < top and (expiry_tick ^ self.current_tick) >> (self.bits * (level + 1)):
+                level += 1
+            if (expiry_tick >> (self.bits * top)) - (self.current_tick >> (self.bits * top)) > self.mask:
+                # Past the wheel's range: park it in the farthest top bucket,
+                # it is rescheduled when that bucket cascades.
+                expiry_tick = self.current_tick + (self.mask << (self.bits * top))
+            bucket = self.wheels[level][(expiry_tick >> (self.bits * level)) & self.mask]
+        bucket[node] = None
+        node.timer_bucket = bucket
+        self.scheduled += 1
+
+    def cancel(self, node):
+        if node.timer_bucket is not None:
+            del node.timer_bucket[node]
+            node.timer_bucket = None
+            self.scheduled -= 1
+
+    def advance(self, now, limit):
+        """
+        Move the wheel forward to now and return up to limit expired nodes,
+        which are unscheduled. Whatever is left over is picked up by the
+        next call.
+        """
+        now_tick = int(now / self.tick)
+        work = 0
+        while work < limit:
+            if self.cascading:
+                bucket = self.cascading[-1]
+                if not bucket:
+                    self.cascading.pop()
+                    continue
+                node, _ = bucket.popitem()
+                node.timer_bucket = None
+                self.scheduled -= 1
+                self.schedule(node, node.expires_at)
+                work += 1
+                continue
+            if self.current_tick >= now_tick or sum(map(len, self.due)) >= limit:
+                break
+            next_tick = None
+            if self.scheduled > sum(map(len, self.due)):
+                next_tick = self._next_event()
+            if next_tick is None or next_tick > now_tick:
+                # Nothing drains or cascades before now, skip the idle ticks.
+                self.current_tick = now_tick
+                break
+            self.current_tick = next_tick
+            self._start_cascade()
+            index = self.current_tick & self.mask
+            if self.wheels[0][index]:
+                # Hand the whole bucket over; its nodes still point at it.
+                self.due.append(self.wheels[0][index])
+                self.wheels[0][index] = {}
+            work += 1
+
+        expired = []
+        while self.due and len(expired) < limit:
+            bucket = self.due[0]
+            if not bucket:
+                self.due.pop(0)
+                continue
+            node, _ = bucket.popitem()
+            node.timer_bucket = None
+            self.scheduled -= 1
+            expired.append(node)
+        return expired
+
+    def caught_up(self, now):
+        # False while advance(now, ...) still has expired nodes or cascades to get through.
+        return not self.cascading and not self.due and (
+            self.current_tick >= int(now / self.tick) or self.scheduled == 0
+        )
+
+    def _next_event(self):
+        # First tick after current_tick with a non-empty bucket to drain or
+        # cascade. Lower levels only hold buckets ahead of the current one in
+        # their turn, so the first level with a hit gives the earliest tick.
+        top = len(self.wheels) - 1
+        for level, wheel in enumerate(self.wheels):
+            shift = self.bits * level
+            position = (self.current_tick >> shift) & self.mask
+            span = self.mask if level == top else self.mask - position
+            for step in range(1, span + 1):
+                if wheel[(position + step) & self.mask]:
+                    return ((self.current_tick >> shift) + step) << shift
+        return None
+
+    def _start_cascade(self):
+        # Each time a level wraps around, queue the next bucket of the level
+        # above to be pulled down into the lower levels.
+        for level in range(1, len(self.wheels)):
+            if (self.current_tick >> (self.bits * (level - 1))) & self.mask:
+                return
+            index = (self.current_tick >> (self.bits * level)) & self.mask
+            if self.wheels[level][index]:
+                self.cascading.append(self.wheels[level][index])
+                self.wheels[level][index] = {}
+
+
 class LRUCache:
-    def __init__(self, capacity):
+    def __init__(self, capacity=None, default_ttl=None, clock=time.monotonic, max_weight=None, weigher=default_weigher):
+        # capacity (entry count) and max_weight (byte budget) can be used
+        # alone or together; None means no limit of that kind.
         self.key_to_cache_node_map = {}
         self.dll = DLL()
         self.capacity = capacity
         self.size = 0
+        self.max_weight = max_weight
+        self.weigher = weigher
+        self.weight = 0
+        self.rejections = 0
         self.lock = ReaderWriterLock()  # Use the custom reader-writer lock.
+        self.miss_lock = threading.Lock()  # Misses are counted under the shared read lock.
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.default_ttl = default_ttl
+        self.clock = clock
+        self.timing_wheel = TimingWheel(now=clock())
+        self.reaper = None
 
     def _move_node_to_front(self, node):
-        # Store head next in temp variable.
-        temp = self.dll.head.next
+        # Remove node from current position (new nodes are not linked yet).
+        if node.prev:
+            node.prev.next = node.next
 
-        # Remove node from current position
-        node.prev.next = node.next
-        node.next.prev = node.prev
+        if node.next:
+            node.next.prev = node.prev
+
+        # Store head next in temp variable. Read it after unlinking, the node
+        # may have been the head next itself.
+        temp = self.dll.head.next
 
         # Connect node with head.
         node.prev = self.dll.head
@@ -82,65 +479,884 @@ class LRUCache:
         temp.prev = node
     
     def get(self, key):
-        # Acquire read lock to allow multiple reads simultaneously.
-        self.lock.acquire_read()
-        try:
-            node = self.key_to_cache_node_map.get(key, None)
-            if not node:
-                print(f"Key {key} doesn't exist in cache.")
+        # Look up under the read lock, so misses don't serialize.
+        with self.lock.read():
+            if key not in self.key_to_cache_node_map:
+                self._count_miss()
                 return None
 
-            val = node.val
+        # Since it's accessed, move the node to the front, which needs the
+        # write lock. The upgradeable lock lets readers in until the upgrade;
+        # look again, the key may have gone since the read lock was dropped.
+        with self.lock.upgradeable():
+            if key not in self.key_to_cache_node_map:
+                self._count_miss()
+                return None
+            self.lock.upgrade()
+            return self._get_locked(key)
 
-            # Since it's accessed, move the node to the front.
-            # Acquire a write lock since this operation modifies the cache.
-            self.lock.release_read()
-            self.lock.acquire_write()
-            try:
-                self._move_node_to_front(node)
-            finally:
-                self.lock.release_write()
+    def _count_miss(self):
+        with self.miss_lock:
+            self.misses += 1
 
-            return val
-        finally:
-            # Ensure the read lock is released if not already.
-            if self.lock.readers > 0:
-                self.lock.release_read()
+    def _get_locked(self, key):
+        # Caller holds the write lock.
+        node = self.key_to_cache_node_map.get(key, None)
+        if node and node.expires_at is not None and node.expires_at <= self.clock():
+            # Lazy expiry: the reaper has not got to this key yet.
+            self._remove_node(node)
+            self.expirations += 1
+            node = None
+        if not node:
+            self.misses += 1
+            return None
 
-    def put(self, key, value):
+        self._move_node_to_front(node)
+        self.hits += 1
+        return node.val
+
+    def put(self, key, value, ttl=None, weight=None):
+        # ttl in seconds, overrides default_ttl; None with no default never expires.
+        # weight: already weighed by the caller, e.g. LoadingCache for the value
+        # inside its wrapper; None weighs value here.
+        ttl = self.default_ttl if ttl is None else ttl
+        # Weigh outside the lock, the weigher may be slow.
+        if self.max_weight is None:
+            weight = 0
+        elif weight is None:
+            weight = self.weigher(key, value)
         # Acquire write lock as this will modify the cache.
         self.lock.acquire_write()
         try:
-            if key in self.key_to_cache_node_map:
-                # Update value of node and move the node to the beginning of DLL.
-                node = self.key_to_cache_node_map[key]
-                node.val = value
-                self._move_node_to_front(node)
-                return
-            
-            if self.size == self.capacity:
-                # Remove last node of DLL as it signifies the least recently used node.
-                to_remove_node = self.dll.tail.prev
-                to_remove_node.prev.next = to_remove_node.next
-                to_remove_node.next.prev = to_remove_node.prev
+            self._put_locked(key, value, ttl, weight)
+        finally:
+            # Ensure the write lock is released.
+            self.lock.release_write()
+
+    def delete(self, key):
+        # Returns whether the key was present.
+        self.lock.acquire_write()
+        try:
+            return self._delete_locked(key)
+        finally:
+            self.lock.release_write()
 
-                to_remove_node.prev = to_remove_node.next = None
-                key_to_remove = to_remove_node.key
+    def get_many(self, keys):
+        """
+        Values for keys, in order, None for misses. Same as calling get for
+        each key in turn, but under a single lock acquisition.
+        """
+        self.lock.acquire_write()
+        try:
+            return [self._get_locked(key) for key in keys]
+        finally:
+            self.lock.release_write()
+
+    def put_many(self, items, ttl=None):
+        # items is a dict or (key, value) pairs, applied in order under one lock.
+        items = list(items.items() if isinstance(items, dict) else items)
+        ttl = self.default_ttl if ttl is None else ttl
+        weights = [self.weigher(key, value) if self.max_weight is not None else 0 for key, value in items]
+        self.lock.acquire_write()
+        try:
+            for (key, value), weight in zip(items, weights):
+                self._put_locked(key, value, ttl, weight)
+        finally:
+            self.lock.release_write()
 
-                del self.key_to_cache_node_map[key_to_remove]
-                del to_remove_node
+    def delete_many(self, keys):
+        # Returns how many of the keys were present.
+        self.lock.acquire_write()
+        try:
+            return sum(self._delete_locked(key) for key in keys)
+        finally:
+            self.lock.release_write()
 
-                self.size -= 1
+    def _delete_locked(self, key):
+        node = self.key_to_cache_node_map.get(key, None)
+        if not node:
+            return False
+        self._remove_node(node)
+        return True
 
-            node = Node(key, value)
+    def _put_locked(self, key, value, ttl, weight):
+        # Caller holds the write lock.
+        node = self.key_to_cache_node_map.get(key, None)
+        if self.max_weight is not None and weight > self.max_weight:
+            # Would not fit even in an empty cache, and the old value is stale.
+            if node:
+                self._remove_node(node)
+            self.rejections += 1
+            return
 
-            # Insert the node at the start of DLL.
+        if node:
+            # Update value of node and move the node to the beginning of DLL.
+            node.val = value
+            self.weight += weight - node.weight
+            node.weight = weight
+            self._set_expiry(node, ttl)
             self._move_node_to_front(node)
+            self._evict_to_budget(node)
+            return
+
+        if self.size == self.capacity:
+            # Remove last node of DLL as it signifies the least recently used node.
+            self._remove_node(self.dll.tail.prev)
+            self.evictions += 1
 
-            # Store node in the key_to_cache map.
-            self.key_to_cache_node_map[key] = node
+        node = Node(key, value)
+        node.weight = weight
+        self.weight += weight
+        self._set_expiry(node, ttl)
+
+        # Insert the node at the start of DLL.
+        self._move_node_to_front(node)
+
+        # Store node in the key_to_cache map.
+        self.key_to_cache_node_map[key] = node
+
+        self.size += 1
+        self._evict_to_budget(node)
+
+    def _set_expiry(self, node, ttl):
+        if ttl is None:
+            node.expires_at = None
+            self.timing_wheel.cancel(node)
+        else:
+            node.expires_at = self.clock() + ttl
+            self.timing_wheel.schedule(node, node.expires_at)
+
+    def _remove_node(self, node):
+        # Unlink node from the DLL, the map and the timing wheel. Caller holds the write lock.
+        node.prev.next = node.next
+        node.next.prev = node.prev
+        node.prev = node.next = None
 
-            self.size += 1
+        del self.key_to_cache_node_map[node.key]
+        self.timing_wheel.cancel(node)
+        self.size -= 1
+        self.weight -= node.weight
+
+    def _evict_to_budget(self, keep):
+        # Evict from the tail until the weight fits the budget again. keep is
+        # the node just put, which fits on its own.
+        if self.max_weight is None:
+            return
+        while self.weight > self.max_weight and self.dll.tail.prev is not keep:
+            self._remove_node(self.dll.tail.prev)
+            self.evictions += 1
+
+    def evict_lru(self, keep_front=False):
+        # Evict the least recently used entry, return whether there was one.
+        # keep_front spares the most recently used entry.
+        self.lock.acquire_write()
+        try:
+            node = self.dll.tail.prev
+            if node is self.dll.head or (keep_front and node is self.dll.head.next):
+                return False
+            self._remove_node(node)
+            self.evictions += 1
+            return True
         finally:
-            # Ensure the write lock is released.
             self.lock.release_write()
+
+    def reap_expired(self, max_items=1000):
+        """
+        Remove up to max_items expired keys under one write lock and return
+        how many were removed. More may be left, see TimingWheel.caught_up.
+        """
+        self.lock.acquire_write()
+        try:
+            now = self.clock()
+            reaped = 0
+            for node in self.timing_wheel.advance(now, max_items):
+                if self.key_to_cache_node_map.get(node.key) is node:
+                    self._remove_node(node)
+                    reaped += 1
+            self.expirations += reaped
+            return reaped
+        finally:
+            self.lock.release_write()
+
+    def start_reaper(self, interval=0.1, max_items=1000):
+        # Background thread that keeps reaping. Between batches it releases
+        # the lock, so a mass expiry is spread over many short critical sections.
+        stop = threading.Event()
+
+        def reap():
+            while not stop.is_set():
+                self.reap_expired(max_items)
+                if self.timing_wheel.caught_up(self.clock()):
+                    stop.wait(interval)
+
+        self.reaper = (threading.Thread(target=reap, daemon=True), stop)
+        self.reaper[0].start()
+
+    def stop_reaper(self):
+        if self.reaper:
+            thread, stop = self.reaper
+            stop.set()
+            thread.join()
+            self.reaper = None
+
+    def stats(self):
+        return {
+            "size": self.size,
+            "capacity": self.capacity,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "weight": self.weight,
+            "max_weight": self.max_weight,
+            "rejections": self.rejections,
+            "lock": self.lock.stats(),
+        }
+
+
+class ClockEntry:
+    __slots__ = ("key", "val", "referenced")
+
+    def __init__(self, key, val):
+        self.key = key
+        self.val = val
+        self.referenced = True
+
+
+class ClockCache:
+    """
+    CLOCK approximation of LRU with lock-free hits. get only reads the map
+    and sets the entry's referenced bit; both are single atomic operations
+    under the GIL. put and eviction are serialized by one mutex. A get that
+    races with the eviction of its key returns the value the entry held
+    when it was found.
+    """
+    def __init__(self, capacity):
+        self.key_to_entry_map = {}
+        self.slots = [None] * capacity
+        self.hand = 0
+        self.capacity = capacity
+        self.size = 0
+        self.lock = threading.Lock()  # Writers only.
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        entry = self.key_to_entry_map.get(key, None)
+        if not entry:
+            # Counters are not locked, so the stats are approximate.
+            self.misses += 1
+            return None
+
+        entry.referenced = True
+        self.hits += 1
+        return entry.val
+
+    def put(self, key, value):
+        with self.lock:
+            entry = self.key_to_entry_map.get(key, None)
+            if entry:
+                entry.val = value
+                entry.referenced = True
+                return
+
+            if self.size < self.capacity:
+                slot = self.size
+                self.size += 1
+            else:
+                slot = self._evict()
+
+            entry = ClockEntry(key, value)
+            self.slots[slot] = entry
+            self.key_to_entry_map[key] = entry
+
+    def _evict(self):
+        # Sweep the hand: give referenced entries a second chance and evict
+        # the first one that was not used since the last sweep.
+        while True:
+            entry = self.slots[self.hand]
+            slot = self.hand
+            self.hand = (self.hand + 1) % self.capacity
+            if entry.referenced:
+                entry.referenced = False
+            else:
+                del self.key_to_entry_map[entry.key]
+                self.evictions += 1
+                return slot
+
+    def stats(self):
+        return {
+            "size": self.size,
+            "capacity": self.capacity,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
+
+
+class ShardedLRUCache:
+    """
+    LRU cache split into independent segments. A key always maps to the
+    same segment, so each segment is an exact LRU over its keys and the
+    whole cache approximates one LRU over all keys.
+    """
+    def __init__(self, capacity=None, shards=16, default_ttl=None, max_weight=None, weigher=default_weigher):
+        if capacity is not None:
+            shards = max(1, min(shards, capacity))
+        # Spread capacity so that the segments add up to it exactly. max_weight
+        # is global: every segment may use all of it (so only an entry heavier
+        # than the whole budget is rejected) and put keeps the sum within it.
+        self.segments = [
+            LRUCache(
+                self._share(capacity, shards, index),
+                default_ttl,
+                max_weight=max_weight,
+                weigher=weigher,
+            )
+            for index in range(shards)
+        ]
+        self.capacity = capacity
+        self.max_weight = max_weight
+        self.weigher = weigher
+        self.hand = 0  # Next segment to evict from when over max_weight.
+
+    @staticmethod
+    def _share(budget, shards, index):
+        if budget is None:
+            return None
+        return budget // shards + (1 if index < budget % shards else 0)
+
+    def _segment(self, key):
+        return self.segments[hash(key) % len(self.segments)]
+
+    def get(self, key):
+        return self._segment(key).get(key)
+
+    def put(self, key, value, ttl=None, weight=None):
+        segment = self._segment(key)
+        segment.put(key, value, ttl, weight)
+        self._evict_to_budget(segment)
+
+    def delete(self, key):
+        return self._segment(key).delete(key)
+
+    def _evict_to_budget(self, segment):
+        # Evict segment tails round-robin until the segments fit max_weight
+        # together, sparing the entry just put into segment. The weights are
+        # read without the segment locks, so concurrent puts may overshoot
+        # or evict a little more than needed; the next put corrects it.
+        if self.max_weight is None:
+            return
+        misses = 0
+        while misses < len(self.segments) and sum(s.weight for s in self.segments) > self.max_weight:
+            self.hand = (self.hand + 1) % len(self.segments)
+            victim = self.segments[self.hand]
+            if victim.evict_lru(keep_front=victim is segment):
+                misses = 0
+            else:
+                misses += 1
+
+    def _group(self, keys):
+        # Segment index -> positions of its keys, in their original order.
+        groups = {}
+        for position, key in enumerate(keys):
+            groups.setdefault(hash(key) % len(self.segments), []).append(position)
+        return groups
+
+    def get_many(self, keys):
+        # One lock acquisition per segment touched. Segments are independent,
+        # so only the order within a segment matters.
+        keys = list(keys)
+        values = [None] * len(keys)
+        for index, positions in self._group(keys).items():
+            found = self.segments[index].get_many([keys[position] for position in positions])
+            for position, value in zip(positions, found):
+                values[position] = value
+        return values
+
+    def put_many(self, items, ttl=None):
+        items = list(items.items() if isinstance(items, dict) else items)
+        if self.max_weight is not None:
+            # The global budget evicts across segments, so which entries
+            # survive depends on the order of all puts, not just per segment.
+            for key, value in items:
+                self.put(key, value, ttl)
+            return
+        for index, positions in self._group([key for key, _ in items]).items():
+            self.segments[index].put_many([items[position] for position in positions], ttl)
+
+    def delete_many(self, keys):
+        keys = list(keys)
+        return sum(
+            self.segments[index].delete_many([keys[position] for position in positions])
+            for index, positions in self._group(keys).items()
+        )
+
+    def reap_expired(self, max_items=1000):
+        return sum(segment.reap_expired(max_items) for segment in self.segments)
+
+    def stats(self):
+        totals = {}
+        locks = []
+        for segment in self.segments:
+            stats = segment.stats()
+            locks.append(stats.pop("lock"))
+            for name, value in stats.items():
+                totals[name] = totals.get(name, 0) + value if value is not None else None
+        totals["lock"] = ReaderWriterLock.merge_stats(locks)
+        totals["capacity"] = self.capacity
+        totals["max_weight"] = self.max_weight
+        totals["shards"] = len(self.segments)
+        return totals
+
+
+class _Loaded:
+    # Cached value plus when to reload it ahead of expiry (None: never).
+    __slots__ = ("value", "refresh_at")
+
+    def __init__(self, value, refresh_at):
+        self.value = value
+        self.refresh_at = refresh_at
+
+
+class LoadingCache:
+    """
+    Read-through wrapper over LRUCache or ShardedLRUCache. loader(key)
+    returns the value or None if the key does not exist. ttl and
+    negative_ttl are passed to put (None results are only cached with
+    negative_ttl); refresh_ahead is the fraction of ttl after which a hit
+    triggers a background reload.
+    """
+    def __init__(self, cache, loader, ttl=None, negative_ttl=None, refresh_ahead=None, refresh_workers=4):
+        self.cache = cache
+        self.loader = loader
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.refresh_ahead = refresh_ahead
+        self.lock = threading.Lock()
+        self.in_flight = {}  # Key -> Future of the load running for it.
+        self.refresher = ThreadPoolExecutor(refresh_workers) if refresh_ahead and refresh_workers else None
+        self.loads = 0
+        self.coalesced = 0
+        self.refreshes = 0
+
+    def get(self, key):
+        entry = self.cache.get(key)
+        if entry is None:
+            return self._load(key, wait=True)
+        if entry.refresh_at is not None and time.monotonic() >= entry.refresh_at:
+            self._load(key, wait=False)
+        return entry.value
+
+    def invalidate(self, key):
+        self.cache.delete(key)
+
+    def _load(self, key, wait):
+        # wait=False is a refresh: start it unless one is running, never block.
+        with self.lock:
+            future = self.in_flight.get(key)
+            leader = future is None
+            if leader:
+                future = self.in_flight[key] = Future()
+            elif wait:
+                self.coalesced += 1
+        if not leader:
+            return future.result() if wait else None
+
+        if not wait:
+            self.refreshes += 1
+            self.refresher.submit(self._run, key, future)
+            return None
+        # A load that finished just before we took the lock already filled the cache.
+        entry = self.cache.get(key)
+        if entry is not None:
+            future.set_result(entry.value)
+            with self.lock:
+                del self.in_flight[key]
+        else:
+            self._run(key, future)
+        return future.result()
+
+    def _run(self, key, future):
+        # Only the leader gets here. Failures are passed to the waiters, not cached.
+        try:
+            self.loads += 1
+            value = self.loader(key)
+            self._store(key, value)
+            future.set_result(value)
+        except BaseException as error:
+            future.set_exception(error)
+        finally:
+            with self.lock:
+                del self.in_flight[key]
+
+    def _store(self, key, value):
+        if value is None:
+            # A missing row is only cached for negative_ttl, never for good.
+            if self.negative_ttl is not None:
+                self._put(key, _Loaded(None, None), self.negative_ttl)
+            else:
+                self.cache.delete(key)
+            return
+        refresh_at = None
+        if self.refresh_ahead and self.ttl:
+            refresh_at = time.monotonic() + self.ttl * self.refresh_ahead
+        self._put(key, _Loaded(value, refresh_at), self.ttl)
+
+    def _put(self, key, entry, ttl):
+        # The cache's weigher knows the loaded value, not the _Loaded wrapper.
+        weight = None
+        if self.cache.max_weight is not None:
+            weight = self.cache.weigher(key, entry.value)
+        self.cache.put(key, entry, ttl, weight)
+
+    def stats(self):
+        return {"loads": self.loads, "coalesced": self.coalesced, "refreshes": self.refreshes}
+
+
+class AsyncLoadingCache(LoadingCache):
+    """
+    LoadingCache for a coroutine loader, used from one event loop. Waiters
+    share the load's task; one waiter being cancelled does not cancel it.
+    """
+    def __init__(self, cache, loader, ttl=None, negative_ttl=None, refresh_ahead=None):
+        super().__init__(cache, loader, ttl, negative_ttl, refresh_ahead, refresh_workers=0)
+
+    async def get(self, key):
+        # No awaits between the checks and in_flight updates, so no lock.
+        entry = self.cache.get(key)
+        if entry is None:
+            task = self.in_flight.get(key)
+            if task is None:
+                task = self.in_flight[key] = asyncio.ensure_future(self._run_async(key))
+            else:
+                self.coalesced += 1
+            return await asyncio.shield(task)
+
+        if entry.refresh_at is not None and time.monotonic() >= entry.refresh_at and key not in self.in_flight:
+            self.refreshes += 1
+            self.in_flight[key] = asyncio.ensure_future(self._run_async(key))
+        return entry.value
+
+    async def _run_async(self, key):
+        try:
+            self.loads += 1
+            value = await self.loader(key)
+            self._store(key, value)
+            return value
+        finally:
+            del self.in_flight[key]
+
+
+def benchmarkThroughput(thread_counts=(1, 2, 4, 8), shard_counts=(1, 4, 16), operations=200_000, keys=10_000):
+    """
+    Run the same get/put mix (90% gets on a skewed key set) from several
+    threads and report total operations per second for the single-lock
+    LRUCache and for ShardedLRUCache with different shard counts.
+    """
+    rng = random.Random(0)
+    workload = [(rng.random() < 0.9, int(rng.paretovariate(1.2)) % keys) for _ in range(operations)]
+
+    def run(cache, threads):
+        per_thread = len(workload) // threads
+
+        def worker(offset):
+            for is_get, key in workload[offset:offset + per_thread]:
+                if is_get:
+                    if cache.get(key) is None:
+                        cache.put(key, key)
+                else:
+                    cache.put(key, key)
+
+        workers = [threading.Thread(target=worker, args=(index * per_thread,)) for index in range(threads)]
+        start = time.perf_counter()
+        for thread in workers:
+            thread.start()
+        for thread in workers:
+            thread.join()
+        return per_thread * threads / (time.perf_counter() - start)
+
+    results = {}
+    for threads in thread_counts:
+        caches = [("LRUCache", LRUCache(keys // 10))]
+        caches += [(f"Sharded x{shards}", ShardedLRUCache(keys // 10, shards)) for shards in shard_counts]
+        for label, cache in caches:
+            results[(label, threads)] = run(cache, threads)
+            print(f"{threads} threads, {label:>12}: {results[(label, threads)] / 1000:8.1f}k ops/s")
+    return results
+
+
+def replayTrace(cache, trace):
+    # Read-through replay: a miss loads the key. Returns the hit ratio.
+    hits = 0
+    for key in trace:
+        if cache.get(key) is None:
+            cache.put(key, key)
+        else:
+            hits += 1
+    return hits / len(trace)
+
+
+def generateClockTraces(length=200_000, keys=50_000, seed=0):
+    """
+    Traces for benchmarkClockVsLRU: a skewed one, and ones where CLOCK's
+    approximate recency could lose to exact LRU (hot set under scans,
+    working set moving over time).
+    """
+    rng = random.Random(seed)
+    # Rank r is drawn with probability about 1/r.
+    zipf = [int(keys ** rng.random()) - 1 for _ in range(length)]
+    # Hot set interrupted by one-off scans over cold keys.
+    scans = []
+    while len(scans) < length:
+        scans += [rng.randrange(1000) for _ in range(5000)]
+        scans += list(range(keys + len(scans), keys + len(scans) + 2000))
+    # Working set that shifts over time.
+    shifting = [rng.randrange(phase * 500, phase * 500 + 2000) for phase in range(length // 10_000) for _ in range(10_000)]
+    return {"zipf": zipf, "hot set + scans": scans[:length], "shifting working set": shifting}
+
+
+def benchmarkClockVsLRU(capacity=2_000, threads=8, operations=200_000):
+    """
+    Hit ratios of LRUCache and ClockCache on the same trace replays, then
+    get throughput from several threads on a warm cache.
+    """
+    results = {}
+    for name, trace in generateClockTraces().items():
+        lru_ratio = replayTrace(LRUCache(capacity), trace)
+        clock_ratio = replayTrace(ClockCache(capacity), trace)
+        results[name] = (lru_ratio, clock_ratio)
+        print(f"{name:>22}: hit ratio LRU {lru_ratio:.3f}, CLOCK {clock_ratio:.3f}")
+
+    for cache in (LRUCache(capacity), ClockCache(capacity)):
+        for key in range(capacity):
+            cache.put(key, key)
+
+        def reader(offset):
+            for index in range(offset, offset + operations // threads):
+                cache.get(index % capacity)
+
+        workers = [threading.Thread(target=reader, args=(index * 7919,)) for index in range(threads)]
+        start = time.perf_counter()
+        for thread in workers:
+            thread.start()
+        for thread in workers:
+            thread.join()
+        throughput = operations / (time.perf_counter() - start)
+        results[type(cache).__name__] = throughput
+        print(f"{type(cache).__name__:>22}: {throughput / 1000:.0f}k gets/s from {threads} threads")
+    return results
+
+
+def benchmarkMassExpiry(keys=200_000, batch_sizes=(None, 10_000, 1_000)):
+    """
+    Expire every key at the same moment and reap them with different batch
+    sizes. Reports the longest single write-lock hold, which is what a
+    concurrent reader would wait for, and the total reap time.
+    """
+    results = {}
+    for max_items in batch_sizes:
+        now = [0.0]
+        cache = LRUCache(keys, clock=lambda: now[0])
+        for key in range(keys):
+            cache.put(key, key, ttl=60)
+        now[0] = 61.0
+
+        longest = total = 0.0
+        while True:
+            start = time.perf_counter()
+            cache.reap_expired(max_items or keys)
+            elapsed = time.perf_counter() - start
+            longest, total = max(longest, elapsed), total + elapsed
+            if cache.timing_wheel.caught_up(now[0]):
+                break
+        assert cache.size == 0
+        label = max_items or "all"
+        results[label] = (longest, total)
+        print(f"batch {label!s:>6}: longest lock hold {longest * 1000:.2f} ms, total {total * 1000:.0f} ms")
+    return results
+
+
+def benchmarkByteBudget(max_weight=64 * 1024 * 1024, operations=50_000, keys=20_000, seed=0):
+    """
+    Put log-uniform sized values (16 bytes to 1 MiB) into an entry-count
+    cache and a byte-budget cache, and compare the memory they really hold
+    (tracemalloc) with the budget. The entry-count cache gets the capacity
+    an average-sized value would fill the budget with.
+    """
+    rng = random.Random(seed)
+    workload = [(rng.randrange(keys), int(16 * 65536 ** rng.random())) for _ in range(operations)]
+    mean_size = sum(size for _, size in workload) / len(workload)
+
+    results = {}
+    for name, make_cache in (
+        ("entry count", lambda: LRUCache(int(max_weight / (mean_size + ENTRY_OVERHEAD)))),
+        ("byte budget", lambda: LRUCache(max_weight=max_weight)),
+    ):
+        tracemalloc.start()
+        cache = make_cache()
+        peak = 0
+        for index, (key, size) in enumerate(workload):
+            cache.put(key, bytes(size))
+            if index % 1000 == 0:
+                peak = max(peak, tracemalloc.get_traced_memory()[0])
+        current = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        results[name] = (current, peak)
+        print(
+            f"{name:>12}: {current / max_weight:.1%} of budget at the end, "
+            f"{peak / max_weight:.1%} at the peak, {cache.size} entries"
+        )
+        del cache
+    return results
+
+
+def benchmarkBatchSize(batch_sizes=(1, 10, 50, 200), keys=10_000, lookups=200_000):
+    """
+    Per-key cost of get_many/put_many against a loop of single get/put, on
+    a plain and a sharded cache, as the batch grows.
+    """
+    rng = random.Random(0)
+    requests = [rng.randrange(keys) for _ in range(lookups)]
+    results = {}
+    for name, make_cache in (("LRUCache", lambda: LRUCache(keys)), ("ShardedLRUCache", lambda: ShardedLRUCache(keys))):
+        for batch_size in batch_sizes:
+            batches = [requests[start:start + batch_size] for start in range(0, lookups, batch_size)]
+            timings = {}
+            for mode in ("single", "batched"):
+                cache = make_cache()
+                start = time.perf_counter()
+                for batch in batches:
+                    if mode == "single":
+                        for key in batch:
+                            if cache.get(key) is None:
+                                cache.put(key, key)
+                    else:
+                        values = cache.get_many(batch)
+                        cache.put_many([(key, key) for key, value in zip(batch, values) if value is None])
+                timings[mode] = (time.perf_counter() - start) / lookups
+            results[(name, batch_size)] = timings
+            print(
+                f"{name:>16} batch {batch_size:>4}: {timings['single'] * 1e9:.0f} ns/key single, "
+                f"{timings['batched'] * 1e9:.0f} ns/key batched"
+            )
+    return results
+
+
+def benchmarkStampede(threads=200, rounds=5, ttl=0.2, load_time=0.02):
+    """
+    A hot key expires and threads all ask for it at once. Counts backend
+    calls per expiry for a plain get-then-load-then-put, for LoadingCache
+    and for AsyncLoadingCache with as many coroutines.
+    """
+    calls = [0]
+
+    def backend(key):
+        calls[0] += 1
+        time.sleep(load_time)
+        return f"row {key}"
+
+    def naive(cache):
+        def get(key):
+            value = cache.get(key)
+            if value is None:
+                value = backend(key)
+                cache.put(key, value, ttl)
+            return value
+        return get
+
+    results = {}
+    for name, make_get in (
+        ("get then load", lambda: naive(LRUCache(100))),
+        ("LoadingCache", lambda: LoadingCache(LRUCache(100), backend, ttl=ttl).get),
+    ):
+        get = make_get()
+        calls[0] = 0
+        for _ in range(rounds):
+            time.sleep(ttl)  # Let the hot key expire.
+            barrier = threading.Barrier(threads)
+
+            def worker():
+                barrier.wait()
+                assert get("hot") == "row hot"
+
+            workers = [threading.Thread(target=worker) for _ in range(threads)]
+            for thread in workers:
+                thread.start()
+            for thread in workers:
+                thread.join()
+        results[name] = calls[0] / rounds
+        print(f"{name:>18}: {results[name]:.1f} backend calls per hot-key miss ({threads} threads)")
+
+    async def async_rounds():
+        async def async_backend(key):
+            calls[0] += 1
+            await asyncio.sleep(load_time)
+            return f"row {key}"
+
+        cache = AsyncLoadingCache(LRUCache(100), async_backend, ttl=ttl)
+        calls[0] = 0
+        for _ in range(rounds):
+            await asyncio.sleep(ttl)
+            values = await asyncio.gather(*(cache.get("hot") for _ in range(threads)))
+            assert set(values) == {"row hot"}
+        return calls[0] / rounds
+
+    results["AsyncLoadingCache"] = asyncio.run(async_rounds())
+    print(f"{'AsyncLoadingCache':>18}: {results['AsyncLoadingCache']:.1f} backend calls per hot-key miss ({threads} coroutines)")
+    return results
+
+
+def benchmarkWriterLatency(readers=8, duration=2.0, read_hold=0.0005, write_interval=0.005):
+    """
+    Reader threads take the read lock back to back, holding it briefly, so
+    at almost every moment some reader holds it. One writer asks for the
+    write lock every write_interval. Reports the writer's wait with the old
+    reader-preferring lock and with ReaderWriterLock.
+    """
+    results = {}
+    for name, lock in (("reader-preferring", _ReaderPreferringLock()), ("writer-preferring", ReaderWriterLock())):
+        stop = threading.Event()
+        reads = [0]
+
+        def reader():
+            while not stop.is_set():
+                lock.acquire_read()
+                time.sleep(read_hold)
+                reads[0] += 1
+                lock.release_read()
+
+        waits = []
+
+        def writer():
+            while not stop.is_set():
+                start = time.perf_counter()
+                lock.acquire_write()
+                waits.append(time.perf_counter() - start)
+                lock.release_write()
+                time.sleep(write_interval)
+
+        threads = [threading.Thread(target=reader) for _ in range(readers)] + [threading.Thread(target=writer)]
+        for thread in threads:
+            thread.start()
+        # A starved writer only gets in once the readers stop.
+        time.sleep(duration)
+        stop.set()
+        for thread in threads:
+            thread.join()
+
+        waits.sort()
+        results[name] = {
+            "writes": len(waits),
+            "p50": waits[len(waits) // 2],
+            "p99": waits[int(len(waits) * 0.99)],
+            "max": waits[-1],
+            "reads/s": reads[0] / duration,
+        }
+        print(
+            f"{name:>18}: {len(waits)} writes, wait p50 {results[name]['p50'] * 1000:.2f} ms, "
+            f"p99 {results[name]['p99'] * 1000:.2f} ms, max {results[name]['max'] * 1000:.0f} ms, "
+            f"{results[name]['reads/s']:.0f} reads/s"
+        )
+    return results
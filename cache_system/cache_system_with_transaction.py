@@ -4,17 +4,87 @@ cache in batches, and entore cache should be updated as a transaction
 i.e. if anything fails then entire transaction should rollback.
 
 Implement rollback and commit methods.
+
+Undo log:
+    - Copying the whole cache before every batch makes a 3-key transaction
+      on a 1M-entry cache cost O(1M). Instead, while a transaction is open,
+      every change put makes is recorded with what it takes to undo it:
+        * ("update", node, old value, old prev neighbour)
+        * ("insert", node, tombstone it replaced)
+        * ("evict", node, old prev neighbour)
+        * ("delete", node, old prev neighbour)
+    - Rollback undoes the records newest first, so each one sees the cache
+      exactly as it was right after its change. Commit just drops the log.
+      Commit is O(1), rollback O(batch).
+
+Optimistic transactions (MVCC):
+    - Every committed write gets a new version number, and each node keeps
+      a short chain of (version, value) pairs. begin() returns a
+      Transaction reading the snapshot as of the latest committed version:
+      its reads take no lock, writes are buffered in the handle.
+    - commit() validates under the lock that nothing the transaction read
+      or wrote has a newer version than its snapshot, then applies the
+      writes under one new version. On a conflict nothing is applied and
+      commit returns False, so the caller can retry.
+    - Old versions are pruned once no open snapshot can see them. Evicted
+      keys are not versioned: a snapshot read of one is a miss, like any
+      cache miss.
+    - Plain get/put/delete take the lock and are one-write commits. A
+      delete leaves a tombstone version in deleted, so older snapshots
+      still read the value and validation sees the delete; it is dropped
+      once no open snapshot predates it.
+
+Persistence (LRUCache(capacity, persistence=Persistence(directory))):
+    - Every put, delete and committed transaction is appended to a log as
+      one length + CRC32 framed pickle record, so a transaction is either
+      replayed whole or, if its record was torn by a crash, not at all.
+      Reads are not logged, so recency after a restart is approximate.
+    - Snapshots hold the entries in recency order. snapshot() switches to
+      a new log file and pins the current version like a transaction
+      does. A thread walks the DLL in chunks, taking the lock for one
+      chunk at a time, and reads each value as of the pinned version from
+      the node's version chain. A write that moves or evicts a node the
+      walk has not reached yet hands that node to the walk first, so
+      every entry of the pinned version is written once. A rollback that
+      puts such a node back takes it back from the walk. Logs older than
+      the snapshot are then deleted.
+    - Persistence(directory, fork=True) has a forked child write from its
+      copy-on-write view of the cache instead, in exact recency order.
+      Only for processes with no other threads, a lock held by another
+      thread at fork time (logging, stdout, imports) stays held forever
+      in the child.
+    - On startup the cache loads the latest snapshot and replays the logs
+      written since.
 """
 
 
+import contextlib
+import glob
+import io
+import os
+import pickle
+import random
+import shutil
+import struct
+import tempfile
 import threading
+import time
+import zlib
+
+_TOMBSTONE = object()  # Version chain entry of a deleted key.
 
 class Node:
+    __slots__ = ("key", "val", "prev", "next", "versions", "walked")
+
     def __init__(self, key=0, val=0, prev=None, next=None):
         self.key = key
         self.val = val
         self.prev = prev
         self.next = next
+        # (version, value) pairs, oldest first. Replaced, never mutated, so
+        # lock-free readers always see a consistent list.
+        self.versions = ()
+        self.walked = None  # Token of the snapshot walk that collected this node.
 
 class DLL:
     def __init__(self):
@@ -24,21 +94,36 @@ class DLL:
         self.tail.prev = self.head
 
 class LRUCache:
-    def __init__(self, capacity):
+    def __init__(self, capacity, persistence=None):
         self.key_to_cache_node_map = {}
         self.dll = DLL()
         self.capacity = capacity
         self.size = 0
         self.lock = threading.Lock()  # Mutex for write access
-        self.backup = None
+        self.undo_log = None  # List of undo records while a transaction is open.
+        self.version = 0  # Latest committed version.
+        self.snapshots = {}  # Start version -> number of open transactions on it.
+        self.deleted = {}  # Key -> version chain ending in a tombstone, in delete order.
+        self.walk = None  # _SnapshotWalk of the snapshot being written, if any.
+        self.persistence = None
+        if persistence:
+            # Replay first, so that nothing is logged twice.
+            persistence.recover(self)
+            self.persistence = persistence
 
     def _move_node_to_front(self, node):
-        # Store head next in temp variable.
-        temp = self.dll.head.next
+        if self.walk is not None:
+            self.walk.before_unlink(node, evicted=False)
+        # Remove node from current position (new nodes are not linked yet).
+        if node.prev:
+            node.prev.next = node.next
 
-        # Remove node from current position
-        node.prev.next = node.next
-        node.next.prev = node.prev
+        if node.next:
+            node.next.prev = node.prev
+
+        # Store head next in temp variable. Read it after unlinking, the node
+        # may have been the head next itself.
+        temp = self.dll.head.next
 
         # Connect node with head.
         node.prev = self.dll.head
@@ -47,29 +132,157 @@ class LRUCache:
         # Connect node with head next.
         node.next = temp
         temp.prev = node
+
+    def _unlink(self, node):
+        if self.walk is not None:
+            self.walk.before_unlink(node, evicted=node.next is self.dll.tail)
+        node.prev.next = node.next
+        node.next.prev = node.prev
+        node.prev = node.next = None
+
+    def _link_after(self, node, prev):
+        node.prev = prev
+        node.next = prev.next
+        prev.next.prev = node
+        prev.next = node
     
     def get(self, key):
-        node = self.key_to_cache_node_map.get(key, None)
-        if not node:
-            print(f"Key {key} doesn't exist in cache.")
-            return None
-    
-        val = node.val
-        self._move_node_to_front(node)
-        return val
+        with self.lock:
+            node = self.key_to_cache_node_map.get(key, None)
+            if not node:
+                print(f"Key {key} doesn't exist in cache.")
+                return None
+        
+            val = node.val
+            self._move_node_to_front(node)
+            return val
 
     def put(self, key, value):
+        with self.lock:
+            self._put(key, value, self.version + 1)
+            self.version += 1
+            if self.persistence:
+                self.persistence.append(("put", key, value), self)
+
+    def delete(self, key):
+        with self.lock:
+            node = self.key_to_cache_node_map.get(key, None)
+            if not node:
+                return False
+            self._delete(node, self.version + 1)
+            self.version += 1
+            if self.persistence:
+                self.persistence.append(("delete", key), self)
+            return True
+
+    def _delete(self, node, version):
+        # Remove node, keeping its version chain plus a tombstone for the
+        # snapshots that predate the delete. Caller holds the lock.
+        if self.undo_log is not None:
+            self.undo_log.append(("delete", node, node.prev))
+        self._unlink(node)
+        del self.key_to_cache_node_map[node.key]
+        self.size -= 1
+        self.deleted[node.key] = self._new_versions(node, version, _TOMBSTONE)
+        self._prune_deleted()
+
+    def _prune_deleted(self):
+        # Drop tombstones no open snapshot predates, oldest delete first.
+        oldest = min(self.snapshots, default=self.version)
+        while self.deleted:
+            key = next(iter(self.deleted))
+            if self.deleted[key][-1][0] > oldest:
+                return
+            del self.deleted[key]
+
+    def snapshot(self):
+        """Write a snapshot in the background, see Persistence.snapshot."""
+        with self.lock:
+            return self.persistence.snapshot(self)
+
+    def _load(self, pairs):
+        # Append (key, value) pairs, most recent first, at the tail, up to
+        # capacity. Used to load a snapshot into an empty cache.
+        for key, value in pairs:
+            if self.size == self.capacity:
+                return
+            node = Node(key, value)
+            node.versions = ((self.version, value),)
+            self._link_after(node, self.dll.tail.prev)
+            self.key_to_cache_node_map[key] = node
+            self.size += 1
+
+    def _replay(self, record):
+        # Apply one log record without logging it again.
+        if record[0] == "put":
+            self.put(record[1], record[2])
+        elif record[0] == "delete":
+            self.delete(record[1])
+        else:
+            for key, value in record[1]:
+                self._put(key, value, self.version + 1)
+            self.version += 1
+
+    def begin(self):
+        """Start an optimistic transaction on a snapshot of the cache."""
+        with self.lock:
+            return Transaction(self, self._begin_snapshot())
+
+    def _begin_snapshot(self):
+        # Caller holds the lock. Versions visible now are kept until the
+        # matching _end_snapshot.
+        self.snapshots[self.version] = self.snapshots.get(self.version, 0) + 1
+        return self.version
+
+    def _end_snapshot(self, version):
+        # Caller holds the lock.
+        if self.snapshots[version] == 1:
+            del self.snapshots[version]
+            self._prune_deleted()
+        else:
+            self.snapshots[version] -= 1
+
+    def _read(self, key, version):
+        # Lock-free snapshot read: (value, version written) or (None, 0).
+        node = self.key_to_cache_node_map.get(key, None)
+        versions = node.versions if node else self.deleted.get(key, ())
+        for written, value in reversed(versions):
+            if written <= version:
+                return (None if value is _TOMBSTONE else value), written
+        return None, 0
+
+    def _latest_version(self, key):
+        node = self.key_to_cache_node_map.get(key, None)
+        versions = node.versions if node else self.deleted.get(key, ())
+        return versions[-1][0] if versions else 0
+
+    def _new_versions(self, node, version, value):
+        # Append the new version and drop those no open snapshot can see:
+        # keep everything after the newest one visible to the oldest snapshot.
+        oldest = min(self.snapshots, default=self.version)
+        versions = node.versions
+        start = len(versions) - 1
+        while start > 0 and versions[start][0] > oldest:
+            start -= 1
+        return versions[max(start, 0):] + ((version, value),)
+
+    def _put(self, key, value, version):
+        # Write one key at the given version. Caller holds the lock.
         if key in self.key_to_cache_node_map:
             node = self.key_to_cache_node_map[key]
+            if self.undo_log is not None:
+                self.undo_log.append(("update", node, node.val, node.prev, node.versions))
             node.val = value
+            node.versions = self._new_versions(node, version, value)
             self._move_node_to_front(node)
             return
         
         if self.size == self.capacity:
             # Remove the least recently used node (at the end of the DLL)
             to_remove_node = self.dll.tail.prev
-            to_remove_node.prev.next = to_remove_node.next
-            to_remove_node.next.prev = to_remove_node.prev
+            if self.undo_log is not None:
+                self.undo_log.append(("evict", to_remove_node, to_remove_node.prev))
+            self._unlink(to_remove_node)
 
             # Remove from map and adjust size
             key_to_remove = to_remove_node.key
@@ -77,9 +290,17 @@ class LRUCache:
             self.size -= 1
 
         node = Node(key, value)
+        if self.walk is not None:
+            node.walked = self.walk.token  # Newer than the snapshot.
+        # A deleted key continues its chain, older snapshots may still read it.
+        tombstone = self.deleted.pop(key, None)
+        node.versions = tombstone or ()
+        node.versions = self._new_versions(node, version, value)
         self._move_node_to_front(node)
         self.key_to_cache_node_map[key] = node
         self.size += 1
+        if self.undo_log is not None:
+            self.undo_log.append(("insert", node, tombstone))
 
     def put_transaction(self, updates_batch):
         """
@@ -88,16 +309,25 @@ class LRUCache:
         :param updates_batch: List of (key, value) tuples to update in the cache.
         """
         with self.lock:
-            # Step 2: Store a backup of current state
-            self.backup = self._create_backup()
+            # Step 2: Start recording undo information
+            self.undo_log = []
 
             try:
-                # Step 3: Perform updates synchronously
+                # Step 3: Perform updates synchronously. They are stamped
+                # with the next version but only published by the commit.
+                applied = []
                 for key, value in updates_batch:
-                    self.put(key, value)
+                    self._put(key, value, self.version + 1)
+                    applied.append((key, value))
+
+                # The whole batch is one log record. If it can't be logged
+                # the transaction rolls back.
+                if self.persistence:
+                    self.persistence.append(("tx", applied), self)
                 
                 # Step 5: Commit changes if no exceptions occur
                 self.commit()
+                self.version += 1
                 print("Transaction committed successfully.")
 
             except Exception as e:
@@ -105,39 +335,561 @@ class LRUCache:
                 print(f"Transaction failed with error: {e}. Rolling back...")
                 self.rollback()
 
-    def _create_backup(self):
-        """Create a backup of the current state of the cache."""
-        backup = {
-            'key_to_cache_node_map': self.key_to_cache_node_map.copy(),
-            'dll': DLL(),
-            'size': self.size
-        }
+    def rollback(self):
+        """Undo the changes of the open transaction, newest first."""
+        if self.undo_log is None:
+            return
 
-        # Deep copy the DLL structure
+        for record in reversed(self.undo_log):
+            action, node = record[0], record[1]
+            if action == "update":
+                _, _, old_val, old_prev, old_versions = record
+                node.val = old_val
+                node.versions = old_versions
+                self._unlink(node)
+                self._link_after(node, old_prev)
+            elif action == "insert":
+                self._unlink(node)
+                del self.key_to_cache_node_map[node.key]
+                self.size -= 1
+                if record[2] is not None:
+                    self.deleted[node.key] = record[2]
+            elif action == "delete":
+                _, _, old_prev = record
+                self._link_after(node, old_prev)
+                self.key_to_cache_node_map[node.key] = node
+                self.size += 1
+                self.deleted.pop(node.key, None)
+            else:
+                _, _, old_prev = record
+                self._link_after(node, old_prev)
+                self.key_to_cache_node_map[node.key] = node
+                self.size += 1
+            if self.walk is not None and action != "insert":
+                # Back where it was, so a running snapshot walk takes it from there.
+                self.walk.restore(node)
+
+        self.undo_log = None  # Clear the log after rollback
+        print("Cache state has been rolled back.")
+
+    def commit(self):
+        """Drop the undo log since the transaction succeeded."""
+        self.undo_log = None
+        print("Undo log cleared. Transaction committed.")
+
+    def state(self):
+        """(key, value) pairs from most to least recently used."""
+        pairs = []
         current = self.dll.head.next
         while current != self.dll.tail:
-            node_copy = Node(current.key, current.val)
-            backup['dll'].tail.prev.next = node_copy
-            node_copy.prev = backup['dll'].tail.prev
-            backup['dll'].tail.prev = node_copy
-            node_copy.next = backup['dll'].tail
+            pairs.append((current.key, current.val))
             current = current.next
+        return pairs
 
-        return backup
 
-    def rollback(self):
-        """Restore the cache state from the backup."""
-        if self.backup:
-            self.key_to_cache_node_map = self.backup['key_to_cache_node_map']
-            self.dll = self.backup['dll']
-            self.size = self.backup['size']
-            self.backup = None  # Clear backup after rollback
-            print("Cache state has been rolled back.")
+class Transaction:
+    """
+    Handle returned by LRUCache.begin(). Reads see the snapshot the
+    transaction started on plus its own writes. commit() returns False if
+    another commit touched the read or write set since, rollback() just
+    discards the buffered writes. Usable as a context manager, which
+    commits on success and rolls back on an exception.
+    """
+    def __init__(self, cache, start_version):
+        self.cache = cache
+        self.start_version = start_version
+        self.read_set = {}  # Key -> version the read saw (0 for a miss).
+        self.write_set = {}
+        self.active = True
+
+    def get(self, key):
+        self._check_active()
+        if key in self.write_set:
+            return self.write_set[key]
+        value, version = self.cache._read(key, self.start_version)
+        self.read_set.setdefault(key, version)
+        return value
+
+    def put(self, key, value):
+        self._check_active()
+        self.write_set[key] = value
 
     def commit(self):
-        """Clear the backup since the transaction succeeded."""
-        self.backup = None
-        print("Backup cleared. Transaction committed.")
+        self._check_active()
+        cache = self.cache
+        with cache.lock:
+            self.active = False
+            # Validate before ending the snapshot, which may drop the
+            # tombstones of deletes this transaction has to see.
+            conflict = any(cache._latest_version(key) > self.start_version
+                           for key in (*self.read_set, *self.write_set))
+            cache._end_snapshot(self.start_version)
+            if conflict:
+                return False
+
+            if self.write_set and cache.persistence:
+                cache.persistence.append(("tx", list(self.write_set.items())), cache)
+
+            # Reads refresh recency too, but only now that the lock is held.
+            for key in self.read_set:
+                node = cache.key_to_cache_node_map.get(key, None)
+                if node:
+                    cache._move_node_to_front(node)
+            if self.write_set:
+                for key, value in self.write_set.items():
+                    cache._put(key, value, cache.version + 1)
+                cache.version += 1
+            return True
+
+    def rollback(self):
+        self._check_active()
+        with self.cache.lock:
+            self.active = False
+            self.cache._end_snapshot(self.start_version)
+        self.write_set.clear()
+
+    def _check_active(self):
+        if not self.active:
+            raise Exception("Transaction already committed or rolled back.")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if self.active:
+            if exc_type is None:
+                self.commit()
+            else:
+                self.rollback()
+        return False
+
+
+class _SnapshotWalk:
+    """
+    Recency order of the cache as of one version, collected a chunk at a
+    time. Nodes the walk has not reached yet are handed over by the cache
+    before they move: moved ones join at the walk's current position,
+    evicted ones (always the oldest) go after everything else. A rollback
+    that puts a node back where it was takes it back with restore().
+    All methods are called with the cache lock held.
+    """
+    def __init__(self, cursor, version):
+        self.cursor = cursor  # Next node to visit.
+        self.token = object()  # Marks collected nodes without keeping the walk alive.
+        self.version = version
+        self.nodes = []
+        self.evicted = []  # Oldest last once reversed.
+        self.handed = {}  # Node handed over -> the list it went to.
+
+    def step(self, tail, count):
+        # Visit up to count nodes, return whether the walk reached the tail.
+        while count and self.cursor is not tail:
+            node = self.cursor
+            self.cursor = node.next
+            if node.walked is not self.token:
+                node.walked = self.token
+                self.nodes.append(node)
+            count -= 1
+        return self.cursor is tail
+
+    def before_unlink(self, node, evicted):
+        # node may not be linked yet.
+        if node is self.cursor:
+            self.cursor = node.next
+        if node.prev is None or node.walked is self.token:
+            return
+        node.walked = self.token
+        handed = self.handed[node] = self.evicted if evicted else self.nodes
+        handed.append(node)
+
+    def restore(self, node):
+        # node is back at the place it was handed over from, which was not
+        # visited yet. It was appended recently, so search from the end.
+        handed = self.handed.pop(node, None)
+        if handed is None:
+            return
+        index = len(handed) - 1
+        while handed[index] is not node:
+            index -= 1
+        del handed[index]
+        node.walked = None
+        if node.next is self.cursor:
+            self.cursor = node
+
+
+class Persistence:
+    """
+    Snapshot and append-only log files of one cache in directory:
+    snapshot.<generation> holds the entries as of the start of
+    log.<generation>, later logs follow it.
+    """
+    FRAME = struct.Struct("<II")  # Payload length, CRC32 of the payload.
+
+    def __init__(self, directory, snapshot_every=None, fsync=False, fork=False):
+        # snapshot_every: start a background snapshot after that many log records.
+        # fork: write snapshots from a forked child, single-threaded processes only.
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.snapshot_every = snapshot_every
+        self.fsync = fsync
+        self.fork = fork and hasattr(os, "fork")
+        self.generation = 0
+        self.log = None
+        self.records = 0
+        self.snapshotting = None  # Background writer (pid or thread) while one runs.
+
+    def _path(self, kind, generation):
+        return os.path.join(self.directory, f"{kind}.{generation}")
+
+    def _generations(self, kind):
+        return sorted(int(path.rsplit(".", 1)[1]) for path in glob.glob(self._path(kind, "*")))
+
+    def _frame(self, record):
+        payload = pickle.dumps(record, pickle.HIGHEST_PROTOCOL)
+        return self.FRAME.pack(len(payload), zlib.crc32(payload)) + payload
+
+    def _read_records(self, path):
+        # Yield records up to the first torn or corrupt one, then truncate
+        # the file there so appends continue from a clean end.
+        good = 0
+        with open(path, "r+b") as file:
+            while True:
+                header = file.read(self.FRAME.size)
+                if len(header) < self.FRAME.size:
+                    break
+                length, crc = self.FRAME.unpack(header)
+                payload = file.read(length)
+                if len(payload) < length or zlib.crc32(payload) != crc:
+                    break
+                good = file.tell()
+                yield pickle.loads(payload)
+            file.truncate(good)
+
+    def recover(self, cache):
+        """Load the latest complete snapshot and replay the logs after it."""
+        # Loaded entries get version 1, validation reads version 0 as missing.
+        cache.version += 1
+        # Half-written snapshots of a writer that crashed.
+        for path in glob.glob(os.path.join(self.directory, "tmp-snapshot.*")):
+            os.remove(path)
+        snapshots = self._generations("snapshot")
+        if snapshots:
+            self.generation = snapshots[-1]
+            for record in self._read_records(self._path("snapshot", self.generation)):
+                cache._load(record)
+
+        logs = [generation for generation in self._generations("log") if generation >= self.generation]
+        for generation in logs:
+            for record in self._read_records(self._path("log", generation)):
+                cache._replay(record)
+        self.generation = max([self.generation] + logs)
+        self.log = open(self._path("log", self.generation), "ab")
+
+    def append(self, record, cache):
+        # Caller holds the cache lock, so log order is apply order.
+        self.log.write(self._frame(record))
+        self.log.flush()
+        if self.fsync:
+            os.fsync(self.log.fileno())
+        self.records += 1
+        if self.snapshot_every and self.records >= self.snapshot_every:
+            self.snapshot(cache)
+
+    def snapshot(self, cache, chunk=10_000):
+        """
+        Start writing a snapshot of cache in the background. Caller holds
+        the cache lock. Returns False if a snapshot is already running.
+        """
+        if self.snapshotting is not None and not self._snapshot_done(block=False):
+            return False
+
+        # Everything from here on goes to the next log.
+        self.log.close()
+        self.generation += 1
+        self.log = open(self._path("log", self.generation), "ab")
+        self.records = 0
+        generation = self.generation
+
+        def write(pairs):
+            handle, temporary = tempfile.mkstemp(prefix="tmp-snapshot.", dir=self.directory)
+            with os.fdopen(handle, "wb") as file:
+                batch = []
+                for pair in pairs:
+                    batch.append(pair)
+                    if len(batch) == chunk:
+                        file.write(self._frame(batch))
+                        batch = []
+                if batch:
+                    file.write(self._frame(batch))
+                file.flush()
+                os.fsync(file.fileno())
+            os.replace(temporary, self._path("snapshot", generation))
+
+        if self.fork:
+            pid = os.fork()
+            if pid == 0:
+                # Child: the cache is frozen here by copy-on-write.
+                status = 1
+                try:
+                    write(self._pairs(cache))
+                    status = 0
+                finally:
+                    os._exit(status)
+            self.snapshotting = pid
+        else:
+            walk = cache.walk = _SnapshotWalk(cache.dll.head.next, cache._begin_snapshot())
+
+            def write_walked():
+                done = False
+                while not done:
+                    # One chunk per lock hold, so traffic keeps flowing.
+                    with cache.lock:
+                        done = walk.step(cache.dll.tail, chunk)
+                        if done:
+                            cache.walk = None
+                            cache._end_snapshot(walk.version)
+                write(self._pairs_at(walk.nodes + walk.evicted[::-1], walk.version))
+
+            self.snapshotting = threading.Thread(target=write_walked)
+            self.snapshotting.start()
+        return True
+
+    def wait(self):
+        # Block until the running snapshot, if any, is written and old files
+        # deleted. Not with the cache lock held, the writer takes it to finish.
+        if self.snapshotting is not None:
+            self._snapshot_done(block=True)
+
+    def _snapshot_done(self, block):
+        # Reap a finished snapshot writer and delete what it superseded.
+        if isinstance(self.snapshotting, int):
+            pid, _ = os.waitpid(self.snapshotting, 0 if block else os.WNOHANG)
+            if pid == 0:
+                return False
+        else:
+            self.snapshotting.join(None if block else 0)
+            if self.snapshotting.is_alive():
+                return False
+        self.snapshotting = None
+
+        latest = self._generations("snapshot")
+        if latest:
+            for kind in ("snapshot", "log"):
+                for generation in self._generations(kind):
+                    if generation < latest[-1]:
+                        os.remove(self._path(kind, generation))
+        return True
+
+    @staticmethod
+    def _pairs_at(nodes, version):
+        # Lock-free: the value of every node as of version, skipping nodes
+        # deleted by then.
+        for node in nodes:
+            for written, value in reversed(node.versions):
+                if written <= version:
+                    if value is not _TOMBSTONE:
+                        yield node.key, value
+                    break
+
+    @staticmethod
+    def _pairs(cache):
+        current = cache.dll.head.next
+        while current != cache.dll.tail:
+            yield current.key, current.val
+            current = current.next
+
+    def close(self):
+        self.wait()
+        self.log.close()
+
+
+def checkRollback(trials=500, seed=0):
+    """
+    Run random batches that fail part way (an unhashable key) and check that
+    the map, size and recency order are exactly what they were before. Every
+    other batch succeeds and must match the same puts done one by one.
+    """
+    rng = random.Random(seed)
+    cache = LRUCache(8)
+    with contextlib.redirect_stdout(io.StringIO()):
+        for trial in range(trials):
+            before = cache.state()
+            batch = [(rng.randrange(16), rng.randrange(100)) for _ in range(rng.randrange(1, 12))]
+            if trial % 2:
+                batch.insert(rng.randrange(len(batch) + 1), ([], 0))
+                cache.put_transaction(batch)
+                expected = before
+            else:
+                oracle = LRUCache(8)
+                for key, value in reversed(before):
+                    oracle.put(key, value)
+                for key, value in batch:
+                    oracle.put(key, value)
+                cache.put_transaction(batch)
+                expected = oracle.state()
+
+            assert cache.state() == expected, (trial, batch)
+            assert cache.size == len(expected)
+            assert {key: node.val for key, node in cache.key_to_cache_node_map.items()} == dict(expected)
+            # The DLL must also be linked consistently backwards.
+            current, backwards = cache.dll.tail.prev, []
+            while current != cache.dll.head:
+                backwards.append((current.key, current.val))
+                current = current.prev
+            assert backwards[::-1] == expected
+    return True
+
+
+def checkIsolation(threads=4, accounts=20, transfers=2_000, seed=0):
+    """
+    Threads move money between accounts with retried optimistic
+    transactions while others read every account from a snapshot. Each
+    snapshot must add up to the starting total, and so must the end state.
+    """
+    cache = LRUCache(accounts)
+    for account in range(accounts):
+        cache.put(account, 100)
+    total = 100 * accounts
+    errors = []
+
+    def transfer(worker):
+        rng = random.Random(seed + worker)
+        for _ in range(transfers):
+            source, target = rng.sample(range(accounts), 2)
+            while True:
+                txn = cache.begin()
+                amount = min(txn.get(source), rng.randrange(1, 10))
+                txn.put(source, txn.get(source) - amount)
+                txn.put(target, txn.get(target) + amount)
+                if txn.commit():
+                    break
+
+    def audit():
+        for _ in range(transfers // 10):
+            txn = cache.begin()
+            seen = sum(txn.get(account) for account in range(accounts))
+            txn.rollback()
+            if seen != total:
+                errors.append(seen)
+
+    workers = [threading.Thread(target=transfer, args=(index,)) for index in range(threads)]
+    workers += [threading.Thread(target=audit) for _ in range(2)]
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+
+    assert not errors, errors[:5]
+    assert sum(node.val for node in cache.key_to_cache_node_map.values()) == total
+    assert not cache.snapshots
+    return True
+
+
+def benchmarkOptimistic(threads=4, transactions=5_000, keys=100_000, hot_keys=8):
+    """
+    Read-modify-write transactions of 4 keys from several threads, on keys
+    spread over the whole cache (uncontended) and on a few hot keys
+    (contended). Reports committed transactions/s and how often commit
+    had to retry.
+    """
+    results = {}
+    for name, key_space in (("uncontended", keys), ("contended", hot_keys)):
+        cache = LRUCache(keys)
+        for key in range(keys):
+            cache.put(key, 0)
+        attempts = [0] * threads
+
+        def worker(index):
+            rng = random.Random(index)
+            for _ in range(transactions // threads):
+                chosen = rng.sample(range(key_space), 4)
+                while True:
+                    attempts[index] += 1
+                    txn = cache.begin()
+                    for key in chosen:
+                        txn.put(key, txn.get(key) + 1)
+                    # Stand-in for application work, lets other threads run.
+                    time.sleep(0)
+                    if txn.commit():
+                        break
+
+        workers = [threading.Thread(target=worker, args=(index,)) for index in range(threads)]
+        start = time.perf_counter()
+        for thread in workers:
+            thread.start()
+        for thread in workers:
+            thread.join()
+        elapsed = time.perf_counter() - start
+
+        committed = transactions // threads * threads
+        assert sum(cache._read(key, cache.version)[0] for key in range(key_space)) == committed * 4
+        results[name] = (committed / elapsed, sum(attempts) / committed - 1)
+        print(f"{name:>12}: {committed / elapsed:.0f} commits/s, {results[name][1]:.2f} retries per commit")
+    return results
+
+
+def benchmarkRestart(entries=10_000_000, tail=100_000, fork=False):
+    """
+    Fill a persistent cache, snapshot it in the background, log a tail of
+    further puts and restart. Reports put throughput with logging, how long
+    starting the snapshot and the slowest put during it stall the cache,
+    and the time until the restarted cache is warm again. The benchmark is single-threaded, so fork=True is safe
+    here and shows the stall without the copy.
+    """
+    directory = tempfile.mkdtemp()
+    try:
+        cache = LRUCache(entries, Persistence(directory, fork=fork))
+        start = time.perf_counter()
+        for key in range(entries):
+            cache.put(key, key)
+        fill = time.perf_counter() - start
+
+        start = time.perf_counter()
+        cache.snapshot()
+        stall = time.perf_counter() - start
+        slowest = 0
+        for key in range(tail):
+            before = time.perf_counter()
+            cache.put(-key, key)
+            slowest = max(slowest, time.perf_counter() - before)
+        cache.persistence.wait()
+        written = time.perf_counter() - start
+        cache.persistence.close()
+        del cache
+
+        start = time.perf_counter()
+        restarted = LRUCache(entries, Persistence(directory))
+        restart = time.perf_counter() - start
+        assert restarted.size == entries
+        restarted.persistence.close()
+
+        print(f"logged puts: {entries / fill / 1000:.0f}k/s")
+        print(f"snapshot: {stall * 1000:.1f} ms to start, slowest put {slowest * 1000:.1f} ms, written in {written:.1f} s")
+        print(f"restart to warm ({entries} entries, {tail} log records): {restart:.1f} s")
+        return {"fill": fill, "stall": stall, "slowest": slowest, "written": written, "restart": restart}
+    finally:
+        shutil.rmtree(directory)
+
+
+def benchmarkTransaction(entries=1_000_000, batch=3, transactions=1_000):
+    """Time small transactions against a large cache, committed and rolled back."""
+    cache = LRUCache(entries)
+    for key in range(entries):
+        cache.put(key, key)
+
+    results = {}
+    with contextlib.redirect_stdout(io.StringIO()):
+        for name, poison in (("commit", False), ("rollback", True)):
+            start = time.perf_counter()
+            for index in range(transactions):
+                updates = [(entries + index * batch + offset, offset) for offset in range(batch)]
+                if poison:
+                    updates.append(([], 0))
+                cache.put_transaction(updates)
+            results[name] = (time.perf_counter() - start) / transactions
+    for name, seconds in results.items():
+        print(f"{batch}-key {name} on {entries} entries: {seconds * 1e6:.1f} us")
+    return results
 
 class CacheFactory:
     @staticmethod
@@ -145,27 +897,29 @@ class CacheFactory:
         if cache_type == "LRU":
             return LRUCache(capacity)
 
-# Example of using the cache with transactions
-cache = CacheFactory.create_cache("LRU", 5)
-
-# Example interactive mode for testing
-exit_flag = False
-while not exit_flag:
-    qtype = int(input("Enter 1 for get, 2 for put, 3 for transaction, 4 for exit: "))
-    if qtype == 1:
-        key = input("Enter key: ")
-        print(cache.get(key))
-    elif qtype == 2:
-        key, value = input("Enter key value pair: ").split(" ")
-        cache.put(key, value)
-    elif qtype == 3:
-        updates = []
-        num_updates = int(input("Enter number of updates in the transaction: "))
-        for _ in range(num_updates):
+
+if __name__ == "__main__":
+    # Example of using the cache with transactions
+    cache = CacheFactory.create_cache("LRU", 5)
+
+    # Example interactive mode for testing
+    exit_flag = False
+    while not exit_flag:
+        qtype = int(input("Enter 1 for get, 2 for put, 3 for transaction, 4 for exit: "))
+        if qtype == 1:
+            key = input("Enter key: ")
+            print(cache.get(key))
+        elif qtype == 2:
             key, value = input("Enter key value pair: ").split(" ")
-            updates.append((key, value))
-        cache.put_transaction(updates)
-    elif qtype == 4:
-        exit_flag = True
-    else:
-        print("Invalid input. Try again.")
+            cache.put(key, value)
+        elif qtype == 3:
+            updates = []
+            num_updates = int(input("Enter number of updates in the transaction: "))
+            for _ in range(num_updates):
+                key, value = input("Enter key value pair: ").split(" ")
+                updates.append((key, value))
+            cache.put_transaction(updates)
+        elif qtype == 4:
+            exit_flag = True
+        else:
+            print("Invalid input. Try again.")
@@ -10,128 +10,1155 @@ for a directory, matching files by size or name.
         - size as number.
 
  Solution:
-  - Trie data structure
-     - TC = O(q*len(word))
-     - SC = ?
+  - Trie data structure (path-compressed radix tree)
+     - Children are keyed by the first character of their edge label, so
+       any unicode code point works. Byte names are decoded the same way
+       os.fsdecode does (surrogateescape), which round-trips arbitrary bytes.
+       Two limits follow from matching on the decoded name:
+         * a bytes name and the str it decodes to are the same word, so
+           only one of them can be indexed, the other is rejected as a
+           duplicate;
+         * a bytes prefix must end on a character boundary: b"\\xc3" does
+           not find "é.txt".encode(), it decodes to a lone surrogate.
+     - TC = O(q*len(word)) to locate a prefix + O(k) to walk its k results
+     - SC = O(number of files) nodes; each node keeps only its edge label,
+            its children and a count of the files in its subtree.
 
   - Hashmap
     {size: filenames}
 
+  - Suffix, substring and glob search
+     - A second trie over the reversed names answers suffixes like a prefix.
+     - A trigram index {3 characters: filenames} narrows substrings down to
+       the names containing all of their trigrams.
+     - A glob walks whichever of prefix, suffix or trigram candidates is
+       smallest and matches the pattern against those names only.
+
+  - Snapshot file (saveSnapshot / DirectorySnapshot)
+     - Flat arrays for the trie nodes, a (size, filename) array sorted by
+       size and one string table, opened with mmap and queried in place.
+     - Loading only maps the file, so it takes the same few milliseconds
+       for any index size and every process shares the same page cache.
+
 """
+import fnmatch
+import gc
+import glob
+import mmap
+import os
+import queue
+import random
+import re
+import threading
+import time
+import struct
+import tracemalloc
+from array import array
+from concurrent.futures import ThreadPoolExecutor
+from bisect import bisect_left, bisect_right
+from itertools import islice
+from operator import itemgetter
+
+
+def scanFiles(root, max_workers=8, batch_size=1024):
+    """
+    Yield (path relative to root, size) for every regular file under root.
+    Each top-level subdirectory is walked by its own task on a thread pool;
+    the walkers hand batches to the caller through a bounded queue, so the
+    caller indexes while the walkers are blocked in the filesystem and no
+    full listing is ever built. Symlinks are not followed and unreadable
+    directories are skipped, like os.walk.
+    """
+    batches = queue.Queue(maxsize=64)
+    done = object()
+    stop = threading.Event()
+
+    def walk(top, relative_top):
+        batch = []
+        try:
+            pending = [(top, relative_top)]
+            while pending and not stop.is_set():
+                directory, relative_directory = pending.pop()
+                try:
+                    with os.scandir(directory) as entries:
+                        for entry in entries:
+                            relative_path = os.path.join(relative_directory, entry.name)
+                            try:
+                                if entry.is_dir(follow_symlinks=False):
+                                    pending.append((entry.path, relative_path))
+                                elif entry.is_file(follow_symlinks=False):
+                                    # DirEntry caches this stat result.
+                                    batch.append((relative_path, entry.stat(follow_symlinks=False).st_size))
+                            except OSError:
+                                continue  # Removed or unreadable while scanning.
+                            if len(batch) >= batch_size:
+                                batches.put(batch)
+                                batch = []
+                except OSError:
+                    continue
+            batches.put(batch)
+        except BaseException as error:
+            batches.put(error)
+        finally:
+            batches.put(done)
+
+    subdirectories = []
+    with os.scandir(root) as entries:
+        for entry in entries:
+            if entry.is_dir(follow_symlinks=False):
+                subdirectories.append((entry.path, entry.name))
+            elif entry.is_file(follow_symlinks=False):
+                yield entry.name, entry.stat(follow_symlinks=False).st_size
+
+    if not subdirectories:
+        return
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        for top, relative_top in subdirectories:
+            executor.submit(walk, top, relative_top)
+
+        running = len(subdirectories)
+        try:
+            while running:
+                item = batches.get()
+                if item is done:
+                    running -= 1
+                elif isinstance(item, BaseException):
+                    raise item
+                else:
+                    yield from item
+        finally:
+            # The caller stopped early or a walker failed: let the other
+            # walkers wind down and unblock them until they have all exited.
+            stop.set()
+            while running:
+                if batches.get() is done:
+                    running -= 1
+
 
 class TrieNode:
-    def __init__(self):
-        self.children = [None] * 26  # Array for 26 alphabets
-        self.files_with_prefix = []  # Files sharing this prefix
-        self.word_complete_status = False
+    __slots__ = ("label", "children", "count", "filename")
+
+    def __init__(self, label=""):
+        self.label = label          # Edge label leading into this node
+        self.children = None        # {first char of child label: child}, allocated lazily
+        self.count = 0              # Number of files stored in this subtree
+        self.filename = None        # Set when a word ends at this node
 
 
 class Trie:
     def __init__(self):
         self.root = TrieNode()
-    
+
+    @classmethod
+    def bulkLoad(cls, words_and_filenames):
+        """
+        Build a trie from (word, filename) pairs in one pass over the sorted
+        words instead of inserting them one by one. Input that is already
+        sorted costs a single linear check in the sort. For duplicate words
+        the last filename wins, like repeated insertWord calls.
+        """
+        trie = cls()
+
+        # The build allocates millions of acyclic objects; keep the cyclic
+        # garbage collector from rescanning them over and over meanwhile.
+        gc_was_enabled = gc.isenabled()
+        gc.disable()
+        try:
+            entries = sorted(((cls._normalizeWord(word), filename) for word, filename in words_and_filenames),
+                             key=itemgetter(0))
+            words = [word for word, _ in entries]
+            filenames = [filename for _, filename in entries]
+            del entries
+
+            # Drop all but the last of each run of equal words.
+            unique = [index for index in range(len(words))
+                      if index + 1 == len(words) or words[index] != words[index + 1]]
+            if len(unique) != len(words):
+                words = [words[index] for index in unique]
+                filenames = [filenames[index] for index in unique]
+
+            if words:
+                cls._buildFromSorted(trie.root, words, filenames)
+        finally:
+            if gc_was_enabled:
+                gc.enable()
+
+        return trie
+
+    @staticmethod
+    def _buildFromSorted(root, words, filenames):
+        # Each stack entry is a node still to be built: the parent to hang it
+        # on, the range of sorted words below it and the length of the path
+        # above it. Every word in a range shares that path, so the node's
+        # label is the common prefix of the first and last word in the range
+        # and its count is simply the size of the range.
+        stack = [(None, 0, len(words), 0)]
+        while stack:
+            parent, low, high, depth = stack.pop()
+            first = words[low]
+            if parent is None:
+                node, end = root, 0
+            else:
+                if high - low == 1:
+                    end = len(first)
+                else:
+                    last = words[high - 1]
+                    end = depth + 1  # Every word in the range shares the key character.
+                    limit = min(len(first), len(last))
+                    while end < limit and first[end] == last[end]:
+                        end += 1
+                node = TrieNode(first[depth:end])
+                if parent.children is None:
+                    parent.children = {}
+                parent.children[first[depth]] = node
+            node.count = high - low
+
+            if len(first) == end:
+                node.filename = filenames[low]
+                low += 1
+
+            # Split the rest of the range by the character after the label.
+            # Children are pushed in reverse so they get built, and stored,
+            # in sorted order.
+            path = first[:end]
+            child_ranges = []
+            while low < high:
+                ch = words[low][end]
+                if ord(ch) < 0x10FFFF:
+                    split = bisect_left(words, path + chr(ord(ch) + 1), low, high)
+                else:
+                    split = high
+                child_ranges.append((node, low, split, end))
+                low = split
+            stack.extend(reversed(child_ranges))
+
     def insertWord(self, word, filename):
+        word = self._normalizeWord(word)
         node = self.root
+        path = [node]
+        i = 0
 
-        for ch in word:
-            index = ord(ch) - ord('a')
-            if not node.children[index]:
-                node.children[index] = TrieNode()
-            node = node.children[index]
-            node.files_with_prefix.append(filename)  # Add file to prefix list
-        
-        node.word_complete_status = True
+        while i < len(word):
+            child = node.children.get(word[i]) if node.children else None
+            if child is None:
+                # No edge shares a character with the rest of the word, hang it
+                # off the current node as a single compressed edge.
+                child = TrieNode(word[i:])
+                if node.children is None:
+                    node.children = {}
+                node.children[word[i]] = child
+                path.append(child)
+                node = child
+                break
+
+            label = child.label
+            common = self._commonPrefixLength(label, word, i)
+            if common < len(label):
+                # Word diverges inside the edge label, split the edge in two.
+                middle = TrieNode(label[:common])
+                middle.count = child.count
+                middle.children = {label[common]: child}
+                child.label = label[common:]
+                node.children[word[i]] = middle
+                child = middle
+
+            path.append(child)
+            node = child
+            i += common
+
+        if node.filename is None:
+            # Only a new word changes the subtree counts on its path.
+            for path_node in path:
+                path_node.count += 1
+        node.filename = filename
 
     def searchPrefix(self, prefix):
-        node = self.root
+        node = self._findPrefixNode(prefix)
+        if node is None:
+            return []  # Prefix not found
 
-        for ch in prefix:
-            index = ord(ch) - ord('a')
-            if not node.children[index]:
-                return []  # Prefix not found
-            node = node.children[index]
-        
-        return node.files_with_prefix  # Return all files with this prefix
+        return list(self._walk([node]))  # Return all files with this prefix
+
+    def iterPrefix(self, prefix, after=None, ordered=False):
+        """
+        Lazily yield the files under prefix straight from the tree walk.
+        ordered=True yields words in lexicographic (code point) order,
+        otherwise in storage order. after resumes the walk right behind
+        that word, so the last word of a page works as a continuation token.
+        """
+        node, path = self._findPrefixNodeAndPath(prefix)
+        if node is None:
+            return iter(())
+
+        if after is None:
+            stack = [node]
+        else:
+            stack = self._resumeStack(node, path, self._normalizeWord(after), ordered)
+        return self._walk(stack, ordered)
+
+    def countPrefix(self, prefix):
+        node = self._findPrefixNode(prefix)
+        return node.count if node else 0
+
+    def lookupWord(self, word):
+        # The filename stored under word, or None.
+        path = self._findWordPath(self._normalizeWord(word))
+        return path[-1].filename if path else None
 
     def removeWord(self, word, filename):
+        path = self._findWordPath(self._normalizeWord(word))
+        if path is None or path[-1].filename is None:
+            raise Exception(f"File {filename} not found in Trie.")
+
+        node = path[-1]
+        node.filename = None
+        for path_node in path:
+            path_node.count -= 1
+
+        if len(path) == 1:
+            return  # The empty word lives on the root, which is never pruned.
+
+        # Every node other than the root either holds a file or branches, so
+        # at most the removed node and its parent need fixing up.
+        parent = path[-2]
+        if not node.children:
+            del parent.children[node.label[0]]
+            if not parent.children:
+                parent.children = None
+            if parent is not self.root and parent.filename is None and parent.children and len(parent.children) == 1:
+                self._mergeWithOnlyChild(parent)
+        elif len(node.children) == 1:
+            self._mergeWithOnlyChild(node)
+
+    @staticmethod
+    def _mergeWithOnlyChild(node):
+        # Fold the single child into node. The first character of node's
+        # label is unchanged, so the parent's key for node stays valid.
+        (child,) = node.children.values()
+        node.label += child.label
+        node.children = child.children
+        node.filename = child.filename
+
+    def _findPrefixNode(self, prefix):
+        # Returns the highest node whose path starts with prefix. The prefix
+        # may end in the middle of that node's edge label.
+        # This is the hot path of every search, so the bytes check and the
+        # child lookup are inlined.
+        if isinstance(prefix, bytes):
+            prefix = os.fsdecode(prefix)
         node = self.root
+        i = 0
+        end = len(prefix)
 
-        for ch in word:
-            index = ord(ch) - ord('a')
-            if not node.children[index]:
-                raise Exception(f"File {filename} not found in Trie.")
-            node = node.children[index]
-            # Remove file from the prefix list
-            if filename in node.files_with_prefix:
-                node.files_with_prefix.remove(filename)
+        while i < end:
+            children = node.children
+            if not children:
+                return None
+            child = children.get(prefix[i])
+            if child is None:
+                return None
+
+            label = child.label
+            if not prefix.startswith(label, i):
+                # Either the prefix ends inside this label or it diverges.
+                return child if label.startswith(prefix[i:]) else None
+
+            node = child
+            i += len(label)
+
+        return node
+
+    def _findPrefixNodeAndPath(self, prefix):
+        # Same as _findPrefixNode, but also returns the full word the node
+        # stands for, which may extend past the end of prefix.
+        prefix = self._normalizeWord(prefix)
+        node = self.root
+        i = 0
+
+        while i < len(prefix):
+            child = node.children.get(prefix[i]) if node.children else None
+            if child is None:
+                return None, None
+
+            label = child.label
+            if not prefix.startswith(label, i):
+                if label.startswith(prefix[i:]):
+                    return child, prefix[:i] + label
+                return None, None
+
+            node = child
+            i += len(label)
+
+        return node, prefix
+
+    def _resumeStack(self, node, path, after, ordered):
+        # Build the walk stack as it would be right after the walk of
+        # node's subtree reported after. In storage order the position of a
+        # word that has since been removed can only be recovered while its
+        # branch still exists; lexicographic order can always be resumed.
+        if not after.startswith(path):
+            if path.startswith(after) or (ordered and after < path):
+                return [node]
+            if ordered:
+                return []
+            raise Exception(f"Cursor {after!r} is not valid for this search.")
+
+        stack = []
+        rest = after[len(path):]
+        while rest:
+            children = node.children or {}
+            keys = sorted(children) if ordered else list(children)
+            child = children.get(rest[0])
+            if child is None:
+                if not ordered:
+                    raise Exception(f"Cursor {after!r} no longer exists, restart the search.")
+                later = [key for key in keys if key > rest[0]]
+            else:
+                later = keys[keys.index(rest[0]) + 1:]
+            stack.extend(children[key] for key in reversed(later))
+            if child is None:
+                return stack
+
+            label = child.label
+            if not rest.startswith(label):
+                # after ends or diverges inside this edge.
+                if label.startswith(rest) or (ordered and rest < label):
+                    stack.append(child)
+                elif not ordered:
+                    raise Exception(f"Cursor {after!r} no longer exists, restart the search.")
+                return stack
+
+            node = child
+            rest = rest[len(label):]
+
+        # node is after itself, continue with the words below it.
+        stack.extend(self._childrenInWalkOrder(node, ordered))
+        return stack
+
+    def _findWordPath(self, word):
+        node = self.root
+        path = [node]
+        i = 0
+
+        while i < len(word):
+            child = node.children.get(word[i]) if node.children else None
+            if child is None or not word.startswith(child.label, i):
+                return None
+            path.append(child)
+            node = child
+            i += len(child.label)
+
+        return path
+
+    @staticmethod
+    def _normalizeWord(word):
+        # Raw directory entries may come in as bytes that are not valid in
+        # any encoding; map them into str space without losing information.
+        # See the module docstring for what this means for bytes prefixes.
+        return os.fsdecode(word) if isinstance(word, bytes) else word
+
+    @staticmethod
+    def _commonPrefixLength(label, word, start):
+        length = 0
+        limit = min(len(label), len(word) - start)
+        while length < limit and label[length] == word[start + length]:
+            length += 1
+        return length
+
+    @staticmethod
+    def _childrenInWalkOrder(node, ordered):
+        # Children in the order they are pushed on the walk stack, i.e. the
+        # child to visit first comes last.
+        if not node.children:
+            return []
+        if ordered:
+            return [node.children[key] for key in sorted(node.children, reverse=True)]
+        return reversed(node.children.values())
+
+    @staticmethod
+    def _walk(stack, ordered=False):
+        # Pre-order walk: a word is reported before the longer words below
+        # it, which in ordered mode is exactly lexicographic order.
+        while stack:
+            node = stack.pop()
+            if node.filename is not None:
+                yield node.filename
+            if node.children:
+                stack.extend(Trie._childrenInWalkOrder(node, ordered))
+
+
+class TrigramIndex:
+    """
+    Maps every 3-character substring of a name to the files containing it.
+    A fragment of 3 or more characters can only occur in files that have
+    all of its trigrams, which is usually a small fraction of all files.
+    Postings are dicts used as insertion ordered sets, so candidates come
+    out in the order the files were added, whatever the hash seed.
+    """
+    def __init__(self):
+        self.postings = {}
+
+    def add(self, word, filename):
+        for trigram in self._trigrams(word):
+            self.postings.setdefault(trigram, {})[filename] = None
+
+    def remove(self, word, filename):
+        for trigram in self._trigrams(word):
+            posting = self.postings[trigram]
+            posting.pop(filename, None)
+            if not posting:
+                del self.postings[trigram]
+
+    def estimate(self, fragment):
+        # Upper bound on the files containing fragment.
+        return min(len(self.postings.get(trigram, ())) for trigram in self._trigrams(fragment))
+
+    def candidates(self, fragments):
+        # Files containing every trigram of every fragment, intersected
+        # starting from the smallest posting.
+        postings = sorted((self.postings.get(trigram, {}) for fragment in fragments
+                           for trigram in self._trigrams(fragment)), key=len)
+        result = list(postings[0])
+        for posting in postings[1:]:
+            if not result:
+                break
+            result = [filename for filename in result if filename in posting]
+        return result
+
+    @staticmethod
+    def _trigrams(word):
+        return {word[i:i + 3] for i in range(len(word) - 2)}
+
+
+# Marks a wildcard (*, ? or a [...] class) in the tokens of a glob pattern.
+_WILDCARD = object()
+
+
+def _globTokens(pattern):
+    # Split a glob pattern into literal runs and _WILDCARD markers, using
+    # the same rules as fnmatch.translate for character classes.
+    tokens = []
+    literal = []
+    i = 0
+    while i < len(pattern):
+        ch = pattern[i]
+        i += 1
+        if ch in "*?":
+            wildcard = True
+        elif ch == "[":
+            end = i
+            if end < len(pattern) and pattern[end] == "!":
+                end += 1
+            if end < len(pattern) and pattern[end] == "]":
+                end += 1
+            end = pattern.find("]", end)
+            wildcard = end != -1
+            if wildcard:
+                i = end + 1
+        else:
+            wildcard = False
+
+        if wildcard:
+            if literal:
+                tokens.append("".join(literal))
+                literal = []
+            if not tokens or tokens[-1] is not _WILDCARD:
+                tokens.append(_WILDCARD)
+        else:
+            literal.append(ch)
+
+    if literal:
+        tokens.append("".join(literal))
+    return tokens
 
 
 class DirectorySystem:
     def __init__(self, files: dict):
         self.files = files
         self.files_trie_storage = self.buildTrie(files)
+        self.files_suffix_trie_storage = self.buildSuffixTrie(files)
+        self.files_trigram_storage = self.buildTrigramIndex(files)
         self.file_size_storage = self.buildSizeHashMap(files)
     
+    @classmethod
+    def fromFilesystem(cls, root, max_workers=8):
+        # The scanned entries go straight into the dict the index keeps
+        # anyway; the trie is then bulk loaded from its keys.
+        return cls(dict(scanFiles(root, max_workers)))
+
+    def saveSnapshot(self, path):
+        """
+        Write the trie and the size index in the DirectorySnapshot format.
+        The file is written next to path and renamed into place, so readers
+        never see a partial snapshot.
+        """
+        strings = StringTable()
+
+        # Breadth-first layout: the children of a node are contiguous and
+        # sorted by their first character, so they can be bisected.
+        nodes = [self.files_trie_storage.root]
+        first_children = array("I")
+        child_counts = array("I")
+        index = 0
+        while index < len(nodes):
+            node = nodes[index]
+            children = [node.children[key] for key in sorted(node.children)] if node.children else []
+            first_children.append(len(nodes))
+            child_counts.append(len(children))
+            nodes.extend(children)
+            index += 1
+
+        labels = array("I", (strings.add(node.label) for node in nodes))
+        first_chars = array("I", (ord(node.label[0]) if node.label else 0 for node in nodes))
+        counts = array("I", (node.count for node in nodes))
+        filenames = array("I", (_NO_FILE if node.filename is None else strings.add(node.filename) for node in nodes))
+
+        by_size = sorted(self.files.items(), key=itemgetter(1))
+        sizes = array("q", (filesize for _, filesize in by_size))
+        sized_filenames = array("I", (strings.add(filename) for filename, _ in by_size))
+
+        sections = [labels, first_chars, first_children, child_counts, counts, filenames,
+                     sizes, sized_filenames, strings.offsets, strings.kinds, strings.data]
+        writeSnapshot(path, _SNAPSHOT_HEADER, (_SNAPSHOT_MAGIC, len(nodes), len(sizes), len(strings.kinds)), sections)
+
     def buildTrie(self, files):
-        filesTrieStorage = Trie()
+        trie = Trie.bulkLoad((filename, filename) for filename in files.keys())
+        if trie.root.count != len(files):
+            # bulkLoad keeps one file per word, e.g. of b"a" and "a".
+            raise Exception("Filenames must be unique once bytes names are decoded.")
+        return trie
 
+    def buildSuffixTrie(self, files):
+        # Suffixes of the names are prefixes of the reversed names.
+        return Trie.bulkLoad((Trie._normalizeWord(filename)[::-1], filename) for filename in files.keys())
+
+    def buildTrigramIndex(self, files):
+        trigram_index = TrigramIndex()
         for filename in files.keys():
-            filesTrieStorage.insertWord(filename, filename)
-        
-        return filesTrieStorage
+            trigram_index.add(Trie._normalizeWord(filename), filename)
+
+        return trigram_index
 
     def buildSizeHashMap(self, files):
         file_size_to_filenames_map = {}
 
         for filename, size in files.items():
-            file_size_to_filenames_map[size] = file_size_to_filenames_map.get(size, []) + [filename]
+            # Dicts with None values act as insertion ordered sets, so a
+            # file can be dropped from its size bucket in O(1).
+            file_size_to_filenames_map.setdefault(size, {})[filename] = None
         
         return file_size_to_filenames_map
     
     def insertFile(self, filename, filesize):
-        if filename in self.files:
+        # A bytes name and the str it decodes to share one trie word.
+        if filename in self.files or self.files_trie_storage.lookupWord(filename) is not None:
             raise Exception(f"File with filename {filename} already exists.")
 
         self.files[filename] = filesize
         self.files_trie_storage.insertWord(filename, filename)
-        self.file_size_storage[filesize] = self.file_size_storage.get(filesize, []) + [filename]
+        self.files_suffix_trie_storage.insertWord(Trie._normalizeWord(filename)[::-1], filename)
+        self.files_trigram_storage.add(Trie._normalizeWord(filename), filename)
+        self.file_size_storage.setdefault(filesize, {})[filename] = None
 
     def deleteFile(self, filename):
-        if filename not in self.files:
+        # Check every index before changing any of them.
+        if filename not in self.files or self.files_trie_storage.lookupWord(filename) != filename:
             raise Exception(f"No file with filename {filename} exists.")
-        
+
         filesize = self.files[filename]
         del self.files[filename]
         
         # Remove from size-based hashmap
-        self.file_size_storage[filesize].remove(filename)
+        del self.file_size_storage[filesize][filename]
         if not self.file_size_storage[filesize]:
             del self.file_size_storage[filesize]
 
         # Remove from Trie
         self.files_trie_storage.removeWord(filename, filename)
+        self.files_suffix_trie_storage.removeWord(Trie._normalizeWord(filename)[::-1], filename)
+        self.files_trigram_storage.remove(Trie._normalizeWord(filename), filename)
 
     def searchByPrefix(self, prefix):
         return self.files_trie_storage.searchPrefix(prefix)
 
+    def iterByPrefix(self, prefix, ordered=False, after=None):
+        return self.files_trie_storage.iterPrefix(prefix, after=after, ordered=ordered)
+
+    def searchByPrefixPage(self, prefix, limit=50, cursor=None, ordered=False):
+        """
+        Return one page of files with prefix and the cursor for the next
+        page (None when this is the last page). Only limit + 1 results are
+        produced from the trie walk, whatever the total number of matches.
+        """
+        page = list(islice(self.iterByPrefix(prefix, ordered, cursor), limit + 1))
+        if len(page) > limit:
+            page.pop()
+            return page, page[-1] if page else cursor
+        return page, None
+
+    def searchBySuffix(self, suffix):
+        return self.files_suffix_trie_storage.searchPrefix(Trie._normalizeWord(suffix)[::-1])
+
+    def searchBySubstring(self, fragment):
+        return self.searchByPattern(f"*{glob.escape(fragment)}*")
+
+    def searchByPattern(self, pattern):
+        """
+        Files matching a glob pattern (*, ? and [...] as in fnmatchcase),
+        e.g. "*.log", "*backup*" or "report_??.csv". The literal parts of the
+        pattern pick the candidate set, the pattern itself checks them.
+        """
+        matcher = re.compile(fnmatch.translate(pattern), re.DOTALL).match
+        return [filename for filename in self._patternCandidates(pattern)
+                if matcher(Trie._normalizeWord(filename))]
+
+    def _patternCandidates(self, pattern):
+        tokens = _globTokens(pattern)
+        literals = [token for token in tokens if token is not _WILDCARD]
+
+        # (estimated candidates, candidate producer) per usable index.
+        options = [(len(self.files), lambda: list(self.files))]
+        if tokens and tokens[0] is not _WILDCARD:
+            prefix = tokens[0]
+            options.append((self.files_trie_storage.countPrefix(prefix),
+                            lambda: self.files_trie_storage.searchPrefix(prefix)))
+        if tokens and tokens[-1] is not _WILDCARD:
+            reversed_suffix = tokens[-1][::-1]
+            options.append((self.files_suffix_trie_storage.countPrefix(reversed_suffix),
+                            lambda: self.files_suffix_trie_storage.searchPrefix(reversed_suffix)))
+        fragments = [literal for literal in literals if len(literal) >= 3]
+        if fragments:
+            options.append((min(self.files_trigram_storage.estimate(fragment) for fragment in fragments),
+                            lambda: self.files_trigram_storage.candidates(fragments)))
+
+        _, candidates = min(options, key=itemgetter(0))
+        return candidates()
+
+    def searchBySize(self, size):
+        return list(self.file_size_storage.get(size, ()))
+
+
+_SNAPSHOT_MAGIC = b"DIRSNAP1"
+# magic, node count, size entry count, string count, offsets of the sections.
+_SNAPSHOT_HEADER = struct.Struct("<8sQQQ11Q")
+_NO_FILE = 0xFFFFFFFF
+STRING_IS_BYTES = 1
+
+
+class StringTable:
+    # Deduplicated strings for snapshot files. Byte filenames are stored as
+    # they are and flagged, str as UTF-8 (surrogates included).
+    def __init__(self):
+        self.ids = {}
+        self.offsets = array("Q", [0])
+        self.kinds = bytearray()
+        self.data = bytearray()
+
+    def add(self, string):
+        key = (type(string), string)
+        string_id = self.ids.get(key)
+        if string_id is None:
+            string_id = self.ids[key] = len(self.kinds)
+            if isinstance(string, bytes):
+                self.kinds.append(STRING_IS_BYTES)
+                self.data += string
+            else:
+                self.kinds.append(0)
+                self.data += string.encode("utf-8", "surrogatepass")
+            self.offsets.append(len(self.data))
+        return string_id
+
+
+def writeSnapshot(path, header, fields, sections):
+    # Write header (fields, then the offset of every section) and the
+    # sections, each 8-byte aligned, to a file next to path and rename it
+    # into place, so readers never see a partial snapshot.
+    offset = header.size
+    offsets = []
+    for section in sections:
+        offsets.append(offset)
+        offset += memoryview(section).nbytes
+        offset += -offset % 8
+
+    temporary_path = f"{path}.tmp"
+    with open(temporary_path, "wb") as snapshot:
+        snapshot.write(header.pack(*fields, *offsets))
+        for section_offset, section in zip(offsets, sections):
+            snapshot.write(b"\0" * (section_offset - snapshot.tell()))
+            snapshot.write(section)
+    os.replace(temporary_path, path)
+
+
+class DirectorySnapshot:
+    """
+    Read-only DirectorySystem queries served straight from a snapshot file
+    written by DirectorySystem.saveSnapshot. The file is mapped, never
+    parsed: every array is a memoryview over the mapping and strings are
+    decoded only when a query touches them.
+    """
+    def __init__(self, path):
+        with open(path, "rb") as snapshot:
+            self._mmap = mmap.mmap(snapshot.fileno(), 0, access=mmap.ACCESS_READ)
+        self._buffer = memoryview(self._mmap)
+
+        magic, node_count, size_count, string_count, *offsets = _SNAPSHOT_HEADER.unpack_from(self._buffer)
+        if magic != _SNAPSHOT_MAGIC:
+            self.close()
+            raise Exception(f"{path} is not a directory snapshot.")
+
+        def section(index, length, typecode):
+            itemsize = struct.calcsize(typecode)
+            return self._buffer[offsets[index]:offsets[index] + length * itemsize].cast(typecode)
+
+        self._labels = section(0, node_count, "I")
+        self._first_chars = section(1, node_count, "I")
+        self._first_children = section(2, node_count, "I")
+        self._child_counts = section(3, node_count, "I")
+        self._counts = section(4, node_count, "I")
+        self._filenames = section(5, node_count, "I")
+        self._sizes = section(6, size_count, "q")
+        self._sized_filenames = section(7, size_count, "I")
+        self._string_offsets = section(8, string_count + 1, "Q")
+        self._string_kinds = section(9, string_count, "B")
+        self._string_data = self._buffer[offsets[10]:]
+
+    def close(self):
+        for name, value in list(vars(self).items()):
+            if isinstance(value, memoryview):
+                value.release()
+        self._mmap.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def searchByPrefix(self, prefix):
+        return list(self.iterByPrefix(prefix))
+
+    def iterByPrefix(self, prefix):
+        # Children are stored sorted, so this is lexicographic order.
+        node = self._findPrefixNode(prefix)
+        stack = [] if node is None else [node]
+        while stack:
+            node = stack.pop()
+            if self._filenames[node] != _NO_FILE:
+                yield self._string(self._filenames[node])
+            first_child = self._first_children[node]
+            stack.extend(range(first_child + self._child_counts[node] - 1, first_child - 1, -1))
+
+    def countPrefix(self, prefix):
+        node = self._findPrefixNode(prefix)
+        return 0 if node is None else self._counts[node]
+
     def searchBySize(self, size):
-        return self.file_size_storage.get(size, [])
+        return self.filterBySizeRange(size, size)
+
+    def filterBySizeRange(self, min_file_size, max_file_size):
+        start = bisect_left(self._sizes, min_file_size)
+        stop = bisect_right(self._sizes, max_file_size)
+        return [self._string(self._sized_filenames[index]) for index in range(start, stop)]
+
+    def _string(self, string_id):
+        raw = self._string_data[self._string_offsets[string_id]:self._string_offsets[string_id + 1]].tobytes()
+        if self._string_kinds[string_id] == STRING_IS_BYTES:
+            return raw
+        return raw.decode("utf-8", "surrogatepass")
+
+    def _findPrefixNode(self, prefix):
+        prefix = Trie._normalizeWord(prefix)
+        node = 0
+        i = 0
+        while i < len(prefix):
+            first_child = self._first_children[node]
+            stop = first_child + self._child_counts[node]
+            child = bisect_left(self._first_chars, ord(prefix[i]), first_child, stop)
+            if child == stop or self._first_chars[child] != ord(prefix[i]):
+                return None
+
+            label = self._string(self._labels[child])
+            if not prefix.startswith(label, i):
+                return child if label.startswith(prefix[i:]) else None
+
+            node = child
+            i += len(label)
+
+        return node
+
+
+# Benchmarks
+# The array based trie below is the previous layout (26 child slots and a
+# list of every filename under the prefix at each node). It is kept only as
+# a baseline for the benchmarks.
+
+class _ArrayTrieNode:
+    def __init__(self):
+        self.children = [None] * 26
+        self.files_with_prefix = []
+        self.word_complete_status = False
+
+
+class _ArrayTrie:
+    def __init__(self):
+        self.root = _ArrayTrieNode()
+
+    def insertWord(self, word, filename):
+        node = self.root
+        for ch in word:
+            index = ord(ch) - ord('a')
+            if not node.children[index]:
+                node.children[index] = _ArrayTrieNode()
+            node = node.children[index]
+            node.files_with_prefix.append(filename)
+        node.word_complete_status = True
+
+    def searchPrefix(self, prefix):
+        node = self.root
+        for ch in prefix:
+            index = ord(ch) - ord('a')
+            if not node.children[index]:
+                return []
+            node = node.children[index]
+        return node.files_with_prefix
+
+
+def _generateNames(n, seed=0):
+    # Lowercase names built from a small vocabulary so that, like real
+    # directories, many names share long prefixes.
+    rng = random.Random(seed)
+    stems = ["report", "backup", "invoice", "image", "log", "data", "test", "draft"]
+    names = set()
+    while len(names) < n:
+        suffix = "".join(rng.choice("abcdefghijklmnopqrstuvwxyz") for _ in range(rng.randint(4, 10)))
+        names.add(rng.choice(stems) + suffix)
+    return list(names)
+
+
+def _measureBuild(trie_class, names):
+    tracemalloc.start()
+    start = time.perf_counter()
+    trie = trie_class()
+    for name in names:
+        trie.insertWord(name, name)
+    elapsed = time.perf_counter() - start
+    memory = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return trie, elapsed, memory
+
+
+def benchmarkTrieBuild(n=1_000_000):
+    """
+    Compare build time and memory of the array trie and the radix trie.
+    Memory is measured with tracemalloc, which slows both builds down by
+    the same factor.
+    """
+    names = _generateNames(n)
+    results = {}
+    for label, trie_class in (("array trie", _ArrayTrie), ("radix trie", Trie)):
+        trie, elapsed, memory = _measureBuild(trie_class, names)
+        assert len(trie.searchPrefix("report")) == sum(name.startswith("report") for name in names)
+        results[label] = (elapsed, memory)
+        print(f"{label:>10}: {n} names, build {elapsed:.2f}s, {memory / 2**20:.1f} MiB")
+        del trie
+    return results
+
+
+def benchmarkPrefixLookup(n=200_000, queries=200_000):
+    """
+    Compare prefix lookup speed of the array trie (ord(ch) - ord('a')
+    indexing, lowercase ASCII only) with the radix trie on the same ASCII
+    names, then run the radix trie on mixed unicode and byte names.
+    Both sides only locate the prefix node, results are not walked.
+    """
+    rng = random.Random(1)
+    names = _generateNames(n)
+    lookups = [rng.choice(names)[:rng.randint(1, 12)] for _ in range(queries)]
+
+    array_trie = _ArrayTrie()
+    radix_trie = Trie()
+    for name in names:
+        array_trie.insertWord(name, name)
+        radix_trie.insertWord(name, name)
+
+    timings = {}
+    for label, lookup in (("array trie", array_trie.searchPrefix), ("radix trie", radix_trie.countPrefix)):
+        start = time.perf_counter()
+        for prefix in lookups:
+            lookup(prefix)
+        timings[label] = time.perf_counter() - start
+
+    # Same shape of workload with digits, dots, slashes, non-ASCII and raw bytes.
+    alphabet = "abcXYZ019._-/éßж中😀"
+    unicode_names = ["".join(rng.choice(alphabet) for _ in range(rng.randint(5, 16))) for _ in range(n)]
+    unicode_names += [name.encode("utf-8") + b"\xff" for name in unicode_names[: n // 10]]
+    unicode_trie = Trie()
+    for name in unicode_names:
+        unicode_trie.insertWord(name, name)
+    unicode_lookups = [rng.choice(unicode_names)[:rng.randint(1, 12)] for _ in range(queries)]
+    start = time.perf_counter()
+    for prefix in unicode_lookups:
+        unicode_trie.countPrefix(prefix)
+    timings["radix trie (unicode)"] = time.perf_counter() - start
+
+    for label, elapsed in timings.items():
+        print(f"{label:>20}: {queries / elapsed / 1000:.0f}k lookups/s")
+    return timings
+
+
+def benchmarkChurn(n=200_000, rounds=1_000_000, checkpoints=5):
+    """
+    Keep n files in a DirectorySystem while creating and deleting temp
+    files. Memory is sampled with tracemalloc and must not grow with the
+    number of rounds once the working set is in place.
+    """
+    rng = random.Random(2)
+    directory = DirectorySystem({name: 1 for name in _generateNames(n)})
+    temp_files = []
+
+    tracemalloc.start()
+    samples = []
+    start = time.perf_counter()
+    for round_number in range(1, rounds + 1):
+        name = f"tmp{rng.getrandbits(40):x}"
+        if name not in directory.files:
+            directory.insertFile(name, rng.randint(1, 4096))
+            temp_files.append(name)
+        if len(temp_files) > 1000:
+            # Swap-remove a random temp file.
+            index = rng.randrange(len(temp_files))
+            temp_files[index], temp_files[-1] = temp_files[-1], temp_files[index]
+            directory.deleteFile(temp_files.pop())
+        if round_number % (rounds // checkpoints) == 0:
+            samples.append(tracemalloc.get_traced_memory()[0])
+    elapsed = time.perf_counter() - start
+    tracemalloc.stop()
+
+    print(f"{rounds} insert/delete rounds in {elapsed:.2f}s, "
+          f"memory at checkpoints (KiB): {[sample // 1024 for sample in samples]}")
+    # The first interval fills the temp file pool and lets the dict tables
+    # settle after their resizes, so it is not part of the flatness check.
+    assert max(samples[1:]) <= samples[1] * 1.05, "memory grew under churn"
+    return samples
+
+
+def benchmarkStartup(n=1_000_000):
+    """
+    Compare building a DirectorySystem the previous way (one insertWord per
+    name, size buckets rebuilt with list + [filename]) with the bulk load
+    the constructor uses now. Sizes are drawn from a few values, as with
+    many identical thumbnails or empty files.
+    """
+    rng = random.Random(3)
+    files = {name: rng.choice((0, 4096, 8192)) for name in _generateNames(n)}
+
+    start = time.perf_counter()
+    trie = Trie()
+    for filename in files:
+        trie.insertWord(filename, filename)
+    trie_elapsed = time.perf_counter() - start
+    del trie
+
+    # The list + [filename] buckets are quadratic, so only time a slice of them.
+    sample = dict(islice(files.items(), min(n, 20_000)))
+    start = time.perf_counter()
+    buckets = {}
+    for filename, size in sample.items():
+        buckets[size] = buckets.get(size, []) + [filename]
+    buckets_elapsed = time.perf_counter() - start
+    del buckets
+
+    start = time.perf_counter()
+    directory = DirectorySystem(files)
+    bulk_elapsed = time.perf_counter() - start
+    assert len(directory.searchByPrefix("log")) == sum(name.startswith("log") for name in files)
+
+    print(f"insert per name: trie {trie_elapsed:.2f}s, "
+          f"size buckets {buckets_elapsed:.2f}s for only {len(sample)} names")
+    print(f"      bulk load: trie and size buckets {bulk_elapsed:.2f}s for {n} names")
+    return trie_elapsed, buckets_elapsed, bulk_elapsed
+
+
+def benchmarkSnapshotLoad(n=1_000_000, path="directory.snapshot"):
+    """
+    Time saving a snapshot once and then opening it and answering a first
+    query, which is what every new worker process pays.
+    """
+    rng = random.Random(6)
+    directory = DirectorySystem({name: rng.randint(0, 4096) for name in _generateNames(n)})
+
+    start = time.perf_counter()
+    directory.saveSnapshot(path)
+    save_elapsed = time.perf_counter() - start
+
+    start = time.perf_counter()
+    with DirectorySnapshot(path) as snapshot:
+        count = snapshot.countPrefix("log")
+        first_page = list(islice(snapshot.iterByPrefix("log"), 50))
+        load_elapsed = time.perf_counter() - start
+        assert count == directory.files_trie_storage.countPrefix("log")
+        assert first_page == sorted(directory.searchByPrefix("log"))[:50]
+
+    print(f"{n} names: save {save_elapsed:.2f}s, {os.path.getsize(path) / 2**20:.1f} MiB, "
+          f"open + first query {load_elapsed * 1000:.2f} ms")
+    os.remove(path)
+    return save_elapsed, load_elapsed
+
+
+def benchmarkPatternSearch(n=1_000_000, repeats=5):
+    """
+    Compare suffix, substring and glob searches through the indexes with
+    matching the pattern against every name.
+    """
+    rng = random.Random(7)
+    extensions = ["log", "txt", "csv", "tar.gz", "json"]
+    files = {f"{name}.{rng.choice(extensions)}": 1 for name in _generateNames(n)}
+    start = time.perf_counter()
+    directory = DirectorySystem(files)
+    print(f"built indexes for {n} names in {time.perf_counter() - start:.2f}s")
+
+    results = {}
+    for pattern in ("*.log", "*backup*", "*qzx*", "report*xyz*.csv", "image?ab*"):
+        matcher = re.compile(fnmatch.translate(pattern), re.DOTALL).match
+        timings = []
+        for search in (lambda: [name for name in directory.files if matcher(name)],
+                       lambda: directory.searchByPattern(pattern)):
+            start = time.perf_counter()
+            for _ in range(repeats):
+                matches = search()
+            timings.append((time.perf_counter() - start) / repeats * 1000)
+        results[pattern] = timings
+        print(f"{pattern:>16}: {len(matches):7} matches, scan {timings[0]:7.1f} ms, index {timings[1]:7.1f} ms")
+    return results
+
+
+if __name__ == "__main__":
+    # Example Usage
+    files = {
+        "apple": 100,
+        "application": 150,
+        "banana": 200,
+        "bat": 50
+    }
 
+    directory = DirectorySystem(files)
+    print(directory.searchByPrefix("app"))  # ['apple', 'application']
+    print(directory.searchBySize(100))     # ['apple']
 
-# Example Usage
-files = {
-    "apple": 100,
-    "application": 150,
-    "banana": 200,
-    "bat": 50
-}
+    directory.insertFile("appstore", 250)
+    print(directory.searchByPrefix("app"))  # ['apple', 'application', 'appstore']
 
-directory = DirectorySystem(files)
-print(directory.searchByPrefix("app"))  # ['apple', 'application']
-print(directory.searchBySize(100))     # ['apple']
+    directory.deleteFile("apple")
+    print(directory.searchByPrefix("app"))  # ['application', 'appstore']
 
-directory.insertFile("appstore", 250)
-print(directory.searchByPrefix("app"))  # ['apple', 'application', 'appstore']
+    # Paginated search: pass the returned cursor back in to get the next page.
+    page, cursor = directory.searchByPrefixPage("app", limit=1, ordered=True)
+    print(page, cursor)  # ['application'] application
+    page, cursor = directory.searchByPrefixPage("app", limit=1, cursor=cursor, ordered=True)
+    print(page, cursor)  # ['appstore'] None
 
-directory.deleteFile("apple")
-print(directory.searchByPrefix("app"))  # ['application', 'appstore']
+    # Suffix, substring and glob search.
+    print(directory.searchBySuffix("store"))    # ['appstore']
+    print(directory.searchBySubstring("lica"))  # ['application']
+    print(directory.searchByPattern("*a?a*"))   # ['banana']
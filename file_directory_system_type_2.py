@@ -9,95 +9,608 @@ Requirements:
 
     - Provide option to filter by size directly by provding one size and also range of size.
          - hashmap
-         - sortedSet (To maintain sizes)
+         - sortedList of (size, filename), a range is two bisects and a slice
+           of it: O(log n + k) to list, O(log n) to count.
+
+    - Keep the indexes up to date as files are added, removed, resized or renamed.
+         - hashmap buckets are dicts used as insertion ordered sets, O(1) to update
+         - sortedList add/remove, O(log n)
+
+    - Combine type, size range and name prefix filters in one query.
+         - sortedList of filenames for prefixes
+         - every index can count its matches cheaply, so the query walks the
+           smallest candidate set and checks the other filters per file.
+
+    - Snapshot file (saveSnapshot / DirectorySnapshot)
+         - the name, size and type indexes as flat arrays of string ids plus
+           one string table, opened with mmap and bisected in place, so
+           loading takes milliseconds whatever the number of files.
 
     TODO: Ordered dict (Read about this how it is different from normal dict)
 
 """
-from sortedcontainers import SortedSet
-from bisect           import bisect_left
+import mmap
+import os
+import random
+import struct
+import time
+from array import array
+from operator import itemgetter
+from sortedcontainers import SortedList, SortedSet
+from bisect           import bisect_left, bisect_right
+
+from file_directory_system import scanFiles, StringTable, STRING_IS_BYTES, writeSnapshot
+
+
+class _AfterEveryFilename:
+    # Compares greater than any filename, so (size, _AFTER_EVERY_FILENAME)
+    # sorts right after every (size, filename) pair of that size.
+    def __lt__(self, other):
+        return False
+
+    def __gt__(self, other):
+        return True
+
+
+_AFTER_EVERY_FILENAME = _AfterEveryFilename()
+
 
 class Directory:
     def __init__(self, files: dict):
         self.files = files
         self.filetype_to_filenames_map : dict = self.buildFileTypeToFileMap()
         self.filesize_to_filenames_map : dict = self.buildFileSizeToFileMap()
-        self.filesizes_available_in_sorted_order : SortedSet = self.initializeFileSizesSortedList()
+        self.files_sorted_by_size : SortedList = self.initializeFilesSortedBySize()
+        self.files_sorted_by_name : SortedList = SortedList(self.files.keys())
+
+    @classmethod
+    def fromFilesystem(cls, root, max_workers=8):
+        # Index files as the scanner finds them instead of collecting them
+        # into a dict first.
+        directory = cls({})
+        for filename, filesize in scanFiles(root, max_workers):
+            directory._indexFile(filename, filesize)
+
+        return directory
+
+    @staticmethod
+    def fileType(filename):
+        # Extract extension/filetype of the file. Only the last path
+        # component counts, directories may contain dots too.
+        return os.path.basename(filename).split('.')[-1]
 
     def buildFileTypeToFileMap(self):
         filetype_to_filename_map = {}
 
         for filename in self.files.keys():
-            # Extract extension/filetype of the file
-            filetype = filename.split('.')[-1]
-            filetype_to_filename_map[filetype] = filetype_to_filename_map.get(filetype, []) + [filename]
+            filetype = self.fileType(filename)
+            # Dicts with None values act as insertion ordered sets, so a
+            # file can be dropped from its bucket in O(1).
+            filetype_to_filename_map.setdefault(filetype, {})[filename] = None
         
         return filetype_to_filename_map
     
     def buildFileSizeToFileMap(self):
         filesize_to_filename_map = {}
         for filename, filesize in self.files.items():
-            filesize_to_filename_map[filesize] = filesize_to_filename_map.get(filesize, []) + [filename]
+            filesize_to_filename_map.setdefault(filesize, {})[filename] = None
         
         return filesize_to_filename_map
 
-    def initializeFileSizesSortedList(self):
-        filesize_sorted_list = SortedSet()
-        for filesize in self.files.values():
-            filesize_sorted_list.add(filesize)
-        
-        return filesize_sorted_list
+    def initializeFilesSortedBySize(self):
+        # Sort all (size, filename) pairs once instead of adding them one by one.
+        return SortedList((filesize, filename) for filename, filesize in self.files.items())
+
+    def addFile(self, filename, filesize):
+        if filename in self.files:
+            raise Exception(f"File with filename {filename} already exists.")
+
+        self._indexFile(filename, filesize)
+
+    def removeFile(self, filename):
+        if filename not in self.files:
+            raise Exception(f"No file with filename {filename} exists.")
+
+        self._unindexFile(filename)
+
+    def updateSize(self, filename, filesize):
+        if filename not in self.files:
+            raise Exception(f"No file with filename {filename} exists.")
+
+        old_filesize = self.files[filename]
+        if old_filesize == filesize:
+            return
+
+        self._removeFromSizeIndex(filename, old_filesize)
+        self.files[filename] = filesize
+        self.filesize_to_filenames_map.setdefault(filesize, {})[filename] = None
+        self.files_sorted_by_size.add((filesize, filename))
+
+    def rename(self, filename, new_filename):
+        if filename not in self.files:
+            raise Exception(f"No file with filename {filename} exists.")
+        if new_filename in self.files:
+            raise Exception(f"File with filename {new_filename} already exists.")
+
+        filesize = self._unindexFile(filename)
+        self._indexFile(new_filename, filesize)
+
+    def _indexFile(self, filename, filesize):
+        self.files[filename] = filesize
+        self.filetype_to_filenames_map.setdefault(self.fileType(filename), {})[filename] = None
+        self.filesize_to_filenames_map.setdefault(filesize, {})[filename] = None
+        self.files_sorted_by_size.add((filesize, filename))
+        self.files_sorted_by_name.add(filename)
+
+    def _unindexFile(self, filename):
+        filesize = self.files.pop(filename)
+
+        filetype = self.fileType(filename)
+        del self.filetype_to_filenames_map[filetype][filename]
+        if not self.filetype_to_filenames_map[filetype]:
+            del self.filetype_to_filenames_map[filetype]
+
+        self._removeFromSizeIndex(filename, filesize)
+        self.files_sorted_by_name.remove(filename)
+        return filesize
+
+    def _removeFromSizeIndex(self, filename, filesize):
+        del self.filesize_to_filenames_map[filesize][filename]
+        if not self.filesize_to_filenames_map[filesize]:
+            del self.filesize_to_filenames_map[filesize]
+        self.files_sorted_by_size.remove((filesize, filename))
 
     def filterByType(self, filetype):
-        return self.filetype_to_filenames_map.get(filetype, [])
+        return list(self.filetype_to_filenames_map.get(filetype, ()))
 
     def filterBySize(self, filesize):
-        return self.filesize_to_filenames_map.get(filesize, [])
-
-    def filterBySizeRange(self, min_file_size, max_file_size):
-        # Get index from sortedList from where we have to start fetching files
-        files = []
-        index = bisect_left(self.filesizes_available_in_sorted_order, min_file_size)
-        while index < len(self.filesizes_available_in_sorted_order) and \
-                self.filesizes_available_in_sorted_order[index] <= max_file_size:
-            files.extend(self.filesize_to_filenames_map.get(self.filesizes_available_in_sorted_order[index], []))
+        return list(self.filesize_to_filenames_map.get(filesize, ()))
+
+    def filterBySizeRange(self, min_file_size=None, max_file_size=None):
+        return list(self.iterBySizeRange(min_file_size, max_file_size))
+
+    def iterBySizeRange(self, min_file_size=None, max_file_size=None, reverse=False):
+        # Files ordered by (size, filename), read straight out of the sorted
+        # list. None leaves that end of the range open.
+        start, stop = self._sizeRangeBounds(min_file_size, max_file_size)
+        return map(itemgetter(1), self.files_sorted_by_size.islice(start, stop, reverse=reverse))
+
+    def countBySizeRange(self, min_file_size=None, max_file_size=None):
+        start, stop = self._sizeRangeBounds(min_file_size, max_file_size)
+        return max(stop - start, 0)
+
+    def smallestFiles(self, k):
+        return [filename for _, filename in self.files_sorted_by_size.islice(0, k)]
+
+    def largestFiles(self, k):
+        return [filename for _, filename in self.files_sorted_by_size.islice(max(len(self.files) - k, 0), reverse=True)]
+
+    def filterByPrefix(self, prefix):
+        return list(self.iterByPrefix(prefix))
+
+    def iterByPrefix(self, prefix):
+        start, stop = self._prefixBounds(prefix)
+        return self.files_sorted_by_name.islice(start, stop)
+
+    def countByPrefix(self, prefix):
+        start, stop = self._prefixBounds(prefix)
+        return stop - start
+
+    def query(self, filetype=None, min_file_size=None, max_file_size=None, prefix=None):
+        """
+        Files matching every given filter, e.g.
+        query(filetype="csv", min_file_size=10 * 2**20, max_file_size=2**30, prefix="log_").
+        Returns a DirectoryQuery, which is iterable and can explain() its plan.
+        """
+        return DirectoryQuery(self, filetype, min_file_size, max_file_size, prefix)
+
+    def saveSnapshot(self, path):
+        """
+        Write the name, size and type indexes in the DirectorySnapshot
+        format. The file is written next to path and renamed into place.
+        """
+        strings = StringTable()
+        names = array("I", (strings.add(filename) for filename in self.files_sorted_by_name))
+        sizes = array("q", (filesize for filesize, _ in self.files_sorted_by_size))
+        sized_filenames = array("I", (strings.add(filename) for _, filename in self.files_sorted_by_size))
+
+        # Files grouped by type, types sorted, each group in bucket order.
+        types = array("I")
+        typed_filenames = array("I")
+        for filetype, filenames in sorted(self.filetype_to_filenames_map.items(), key=itemgetter(0)):
+            type_id = strings.add(filetype)
+            for filename in filenames:
+                types.append(type_id)
+                typed_filenames.append(strings.add(filename))
+
+        sections = [names, sizes, sized_filenames, types, typed_filenames,
+                    strings.offsets, strings.kinds, strings.data]
+        writeSnapshot(path, _SNAPSHOT_HEADER, (_SNAPSHOT_MAGIC, len(names), len(strings.kinds)), sections)
+
+    def _prefixBounds(self, prefix):
+        start = self.files_sorted_by_name.bisect_left(prefix)
+        # Smallest string greater than every string starting with prefix:
+        # bump the last character that can still be bumped.
+        end = prefix.rstrip(chr(0x10FFFF))
+        if not end:
+            return start, len(self.files_sorted_by_name)
+        return start, self.files_sorted_by_name.bisect_left(end[:-1] + chr(ord(end[-1]) + 1))
+
+    def _sizeRangeBounds(self, min_file_size, max_file_size):
+        # Positions of the first file of at least min_file_size and the one
+        # after the last file of at most max_file_size.
+        start = 0 if min_file_size is None else self.files_sorted_by_size.bisect_left((min_file_size,))
+        stop = len(self.files_sorted_by_size) if max_file_size is None else \
+            self.files_sorted_by_size.bisect_left((max_file_size, _AFTER_EVERY_FILENAME))
+        return start, stop
+
+
+class DirectoryQuery:
+    """
+    A conjunction of filters on a Directory. Each filter can be answered
+    by one index, and each index knows how many files it would yield. The
+    query walks the index with the fewest candidates and checks the other
+    filters on each candidate, so its cost follows the most selective
+    filter rather than the largest one.
+    """
+    def __init__(self, directory, filetype=None, min_file_size=None, max_file_size=None, prefix=None):
+        self.directory = directory
+        self.filetype = filetype
+        self.min_file_size = min_file_size
+        self.max_file_size = max_file_size
+        self.prefix = prefix
+
+    def filters(self):
+        # {filter name: description} for the filters that were given.
+        filters = {}
+        if self.filetype is not None:
+            filters["type"] = f"type == {self.filetype!r}"
+        if self.min_file_size is not None or self.max_file_size is not None:
+            filters["size"] = f"size in [{self.min_file_size}, {self.max_file_size}]"
+        if self.prefix is not None:
+            filters["prefix"] = f"name starts with {self.prefix!r}"
+        return filters
+
+    def candidateIndexes(self):
+        # (estimated candidates, filter name, lazy candidate iterator) for
+        # the index behind each given filter. The estimates are exact counts
+        # and cost at most O(log n) each.
+        directory = self.directory
+        filters = self.filters()
+        candidates = []
+        if "type" in filters:
+            bucket = directory.filetype_to_filenames_map.get(self.filetype, {})
+            candidates.append((len(bucket), "type", lambda: iter(list(bucket))))
+        if "size" in filters:
+            candidates.append((
+                directory.countBySizeRange(self.min_file_size, self.max_file_size),
+                "size",
+                lambda: directory.iterBySizeRange(self.min_file_size, self.max_file_size),
+            ))
+        if "prefix" in filters:
+            candidates.append((
+                directory.countByPrefix(self.prefix),
+                "prefix",
+                lambda: directory.iterByPrefix(self.prefix),
+            ))
+        if not candidates:
+            candidates.append((len(directory.files), None, lambda: iter(list(directory.files))))
+        return candidates
+
+    def plan(self):
+        # The index with the fewest candidates, plus the filters left to
+        # check on each of its candidates.
+        candidates = self.candidateIndexes()
+        chosen = min(candidates, key=itemgetter(0))
+        residual = [description for name, description in self.filters().items() if name != chosen[1]]
+        return chosen, candidates, residual
+
+    def explain(self):
+        (estimate, name, _), candidates, residual = self.plan()
+        filters = self.filters()
+        source = f"index for {filters[name]}" if name else "all files"
+        lines = [f"walk {source} ({estimate} candidates)"]
+        lines += [f"  then check {description}" for description in residual]
+        lines += [f"  skipped index for {filters[other]} ({count} candidates)"
+                  for count, other, _ in candidates if other != name]
+        return "\n".join(lines)
+
+    def __iter__(self):
+        (_, _, candidates), _, _ = self.plan()
+        directory = self.directory
+        filetype, prefix = self.filetype, self.prefix
+        min_file_size, max_file_size = self.min_file_size, self.max_file_size
+        for filename in candidates():
+            filesize = directory.files[filename]
+            if filetype is not None and directory.fileType(filename) != filetype:
+                continue
+            if min_file_size is not None and filesize < min_file_size:
+                continue
+            if max_file_size is not None and filesize > max_file_size:
+                continue
+            if prefix is not None and not filename.startswith(prefix):
+                continue
+            yield filename
+
+
+_SNAPSHOT_MAGIC = b"DIRTYPE1"
+# magic, file count, string count, offsets of the sections.
+_SNAPSHOT_HEADER = struct.Struct("<8sQQ8Q")
+
+
+class DirectorySnapshot:
+    """
+    Read-only Directory filters served straight from a snapshot file written
+    by Directory.saveSnapshot. Every index is a memoryview over the mapped
+    file, bisected with strings decoded only as the bisection touches them.
+    """
+    def __init__(self, path):
+        with open(path, "rb") as snapshot:
+            self._mmap = mmap.mmap(snapshot.fileno(), 0, access=mmap.ACCESS_READ)
+        self._buffer = memoryview(self._mmap)
+
+        magic, file_count, string_count, *offsets = _SNAPSHOT_HEADER.unpack_from(self._buffer)
+        if magic != _SNAPSHOT_MAGIC:
+            self.close()
+            raise Exception(f"{path} is not a directory snapshot.")
+
+        def section(index, length, typecode):
+            itemsize = struct.calcsize(typecode)
+            return self._buffer[offsets[index]:offsets[index] + length * itemsize].cast(typecode)
+
+        self._names = section(0, file_count, "I")
+        self._sizes = section(1, file_count, "q")
+        self._sized_filenames = section(2, file_count, "I")
+        self._types = section(3, file_count, "I")
+        self._typed_filenames = section(4, file_count, "I")
+        self._string_offsets = section(5, string_count + 1, "Q")
+        self._string_kinds = section(6, string_count, "B")
+        self._string_data = self._buffer[offsets[7]:]
+
+    def close(self):
+        for name, value in list(vars(self).items()):
+            if isinstance(value, memoryview):
+                value.release()
+        self._mmap.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def filterByType(self, filetype):
+        start = bisect_left(self._types, filetype, key=self._string)
+        stop = bisect_right(self._types, filetype, key=self._string)
+        return [self._string(self._typed_filenames[index]) for index in range(start, stop)]
+
+    def filterBySize(self, filesize):
+        return self.filterBySizeRange(filesize, filesize)
+
+    def filterBySizeRange(self, min_file_size=None, max_file_size=None):
+        return list(self.iterBySizeRange(min_file_size, max_file_size))
+
+    def iterBySizeRange(self, min_file_size=None, max_file_size=None):
+        start, stop = self._sizeRangeBounds(min_file_size, max_file_size)
+        return (self._string(self._sized_filenames[index]) for index in range(start, stop))
+
+    def countBySizeRange(self, min_file_size=None, max_file_size=None):
+        start, stop = self._sizeRangeBounds(min_file_size, max_file_size)
+        return max(stop - start, 0)
+
+    def filterByPrefix(self, prefix):
+        return list(self.iterByPrefix(prefix))
+
+    def iterByPrefix(self, prefix):
+        start, stop = self._prefixBounds(prefix)
+        return (self._string(self._names[index]) for index in range(start, stop))
+
+    def countByPrefix(self, prefix):
+        start, stop = self._prefixBounds(prefix)
+        return stop - start
+
+    def _string(self, string_id):
+        raw = self._string_data[self._string_offsets[string_id]:self._string_offsets[string_id + 1]].tobytes()
+        if self._string_kinds[string_id] == STRING_IS_BYTES:
+            return raw
+        return raw.decode("utf-8", "surrogatepass")
+
+    def _prefixBounds(self, prefix):
+        # Same bounds as Directory._prefixBounds, bisecting the mapped names.
+        start = bisect_left(self._names, prefix, key=self._string)
+        end = prefix.rstrip(chr(0x10FFFF))
+        if not end:
+            return start, len(self._names)
+        return start, bisect_left(self._names, end[:-1] + chr(ord(end[-1]) + 1), start, key=self._string)
+
+    def _sizeRangeBounds(self, min_file_size, max_file_size):
+        start = 0 if min_file_size is None else bisect_left(self._sizes, min_file_size)
+        stop = len(self._sizes) if max_file_size is None else bisect_right(self._sizes, max_file_size)
+        return start, stop
+
+
+def benchmarkScan(root, max_workers=8):
+    """
+    Time indexing a real directory tree, e.g. a mounted volume. Run it
+    twice to compare a cold and a warm page cache.
+    """
+    start = time.perf_counter()
+    directory = Directory.fromFilesystem(root, max_workers)
+    elapsed = time.perf_counter() - start
+    print(f"indexed {len(directory.files)} files under {root} in {elapsed:.2f}s "
+          f"with {max_workers} walkers")
+    return directory
+
+
+def checkAgainstRebuild(seed=0, operations=2000):
+    """
+    Apply random adds, removes, resizes and renames to a Directory and,
+    after every step, compare its indexes with a Directory rebuilt from
+    scratch out of the same files.
+    """
+    rng = random.Random(seed)
+    directory = Directory({})
+    names = [f"{stem}{index}.{filetype}" for stem in ("a", "b") for index in range(10) for filetype in ("txt", "csv", "md")]
+
+    def snapshot(directory):
+        return (
+            {filetype: set(filenames) for filetype, filenames in directory.filetype_to_filenames_map.items()},
+            {filesize: set(filenames) for filesize, filenames in directory.filesize_to_filenames_map.items()},
+            list(directory.files_sorted_by_size),
+            list(directory.files_sorted_by_name),
+        )
+
+    for _ in range(operations):
+        filename = rng.choice(names)
+        filesize = rng.randint(0, 8)
+        operation = rng.choice(("add", "remove", "updateSize", "rename"))
+        if filename not in directory.files:
+            directory.addFile(filename, filesize)
+        elif operation == "remove":
+            directory.removeFile(filename)
+        elif operation == "updateSize":
+            directory.updateSize(filename, filesize)
+        elif operation == "rename":
+            new_filename = rng.choice(names)
+            if new_filename not in directory.files:
+                directory.rename(filename, new_filename)
+
+        assert snapshot(directory) == snapshot(Directory(dict(directory.files))), operation
+
+    return True
+
+
+def benchmarkSizeRange(n=1_000_000, queries=200):
+    """
+    Compare size range queries on the sorted (size, filename) list with the
+    previous approach of walking a SortedSet of distinct sizes and
+    extending the result with each size's bucket.
+    """
+    rng = random.Random(4)
+    files = {f"file{index}.dat": rng.randint(0, 10**7) for index in range(n)}
+    directory = Directory(files)
+
+    distinct_sizes = SortedSet(directory.filesize_to_filenames_map.keys())
+    def walkDistinctSizes(min_file_size, max_file_size):
+        result = []
+        index = bisect_left(distinct_sizes, min_file_size)
+        while index < len(distinct_sizes) and distinct_sizes[index] <= max_file_size:
+            result.extend(directory.filesize_to_filenames_map[distinct_sizes[index]])
             index += 1
-        
-        return files
-
-
-# Example cases
-
-files = {
-    "apple.txt": 10,
-    "mango.txt": 10,
-    "car.csv": 100,
-    "truck.csv": 20
-}
-
-directory = Directory(files)
-print(directory.filterBySize(10))
-print(directory.filterBySizeRange(20, 100))
-print(directory.filterBySize(20))
-
-# Sample Test Case 2:
-
-# Empty directory
-empty_files = {}
-empty_directory = Directory(empty_files)
-print(empty_directory.filterByType("txt"))  # []
-print(empty_directory.filterBySize(10))     # []
-print(empty_directory.filterBySizeRange(1, 50))  # []
-
-# Files with duplicate extensions but different sizes
-files = {
-    "doc1.txt": 10,
-    "doc2.txt": 20,
-    "sheet.csv": 100,
-    "data.csv": 20,
-    "readme.md": 5,
-}
-directory = Directory(files)
-print(directory.filterByType("txt"))  # ['doc1.txt', 'doc2.txt']
-print(directory.filterBySize(20))     # ['doc2.txt', 'data.csv']
-print(directory.filterBySizeRange(10, 20))  # ['doc1.txt', 'doc2.txt', 'data.csv']
+        return result
+
+    def timeQueries(query, width):
+        bounds = [(low, low + width) for low in (rng.randint(0, 10**7) for _ in range(queries))]
+        start = time.perf_counter()
+        for low, high in bounds:
+            query(low, high)
+        return (time.perf_counter() - start) / queries * 1e6
+
+    results = {}
+    for label, width in (("narrow", 10**3), ("wide", 10**6)):
+        results[f"{label}, distinct size walk"] = timeQueries(walkDistinctSizes, width)
+        results[f"{label}, sorted slice"] = timeQueries(directory.filterBySizeRange, width)
+        results[f"{label}, count only"] = timeQueries(directory.countBySizeRange, width)
+    start = time.perf_counter()
+    for _ in range(queries):
+        directory.largestFiles(10)
+    results["top 10 largest"] = (time.perf_counter() - start) / queries * 1e6
+
+    for label, micros in results.items():
+        print(f"{label:>26}: {micros:10.1f} us/query")
+    return results
+
+
+def benchmarkQuery(n=1_000_000, repeats=20):
+    """
+    "csv files between 10MB and 1GB starting with 'log_'": intersect the
+    full result of every single filter, as callers had to before, versus
+    letting the query walk the most selective index.
+    """
+    rng = random.Random(5)
+    stems = ["log_", "data_", "img_", "report_"]
+    filetypes = ["csv", "txt", "png", "json"]
+    # Few logs among many other files, sizes spread evenly over orders of magnitude.
+    files = {
+        f"{rng.choices(stems, weights=(1, 30, 30, 30))[0]}{index}.{rng.choice(filetypes)}": int(2 ** rng.uniform(0, 31))
+        for index in range(n)
+    }
+    directory = Directory(files)
+    min_file_size, max_file_size = 10 * 2**20, 2**30
+
+    def intersectFullLists():
+        matches = set(directory.filterByType("csv"))
+        matches &= set(directory.filterBySizeRange(min_file_size, max_file_size))
+        matches &= set(directory.filterByPrefix("log_"))
+        return matches
+
+    def runQuery():
+        return set(directory.query("csv", min_file_size, max_file_size, "log_"))
+
+    assert intersectFullLists() == runQuery()
+    print(directory.query("csv", min_file_size, max_file_size, "log_").explain())
+    results = {}
+    for label, run in (("intersect full lists", intersectFullLists), ("query planner", runQuery)):
+        start = time.perf_counter()
+        for _ in range(repeats):
+            run()
+        results[label] = (time.perf_counter() - start) / repeats * 1000
+        print(f"{label:>20}: {results[label]:.1f} ms/query")
+    return results
+
+
+if __name__ == "__main__":
+    # Example cases
+
+    files = {
+        "apple.txt": 10,
+        "mango.txt": 10,
+        "car.csv": 100,
+        "truck.csv": 20
+    }
+
+    directory = Directory(files)
+    print(directory.filterBySize(10))
+    print(directory.filterBySizeRange(20, 100))
+    print(directory.filterBySize(20))
+
+    # Sample Test Case 2:
+
+    # Empty directory
+    empty_files = {}
+    empty_directory = Directory(empty_files)
+    print(empty_directory.filterByType("txt"))  # []
+    print(empty_directory.filterBySize(10))     # []
+    print(empty_directory.filterBySizeRange(1, 50))  # []
+
+    # Files with duplicate extensions but different sizes
+    files = {
+        "doc1.txt": 10,
+        "doc2.txt": 20,
+        "sheet.csv": 100,
+        "data.csv": 20,
+        "readme.md": 5,
+    }
+    directory = Directory(files)
+    print(directory.filterByType("txt"))  # ['doc1.txt', 'doc2.txt']
+    print(directory.filterBySize(20))     # ['doc2.txt', 'data.csv']
+    print(directory.filterBySizeRange(10, 20))  # ['doc1.txt', 'data.csv', 'doc2.txt']
+
+    # Keep the indexes up to date instead of rebuilding them.
+    directory.addFile("notes.txt", 20)
+    directory.updateSize("doc1.txt", 100)
+    directory.rename("sheet.csv", "sheet.txt")
+    directory.removeFile("readme.md")
+    print(directory.filterByType("txt"))  # ['doc1.txt', 'doc2.txt', 'notes.txt', 'sheet.txt']
+    print(directory.filterBySizeRange(20, 100))  # ['data.csv', 'doc2.txt', 'notes.txt', 'doc1.txt', 'sheet.txt']
+    print(checkAgainstRebuild())  # True
+
+    # Combined filters: the most selective index is walked, the rest are checked per file.
+    files_query = directory.query(filetype="txt", min_file_size=20, prefix="n")
+    print(list(files_query))  # ['notes.txt']
+    print(files_query.explain())
+    # walk index for name starts with 'n' (1 candidates)
+    #   then check type == 'txt'
+    #   then check size in [20, None]
+    #   skipped index for type == 'txt' (4 candidates)
+    #   skipped index for size in [20, None] (5 candidates)